@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Measure how fast requests fare while a slow database call is in flight.
+
+Holds a row lock on one transaction from a separate connection, so a
+POST /transactions for that row waits in the database for --hold seconds, and
+times a burst of fast requests (/health, /categories) before and during that
+wait. A handler that blocks the event loop makes every fast request queue behind
+the slow one. Run it against a live API:
+
+    python -m uvicorn main:app --port 8000 &
+    python -m benchmarks.concurrency --url http://localhost:8000
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from scripts.db import connect
+
+
+def request(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=60) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+
+def burst(base_url, paths, count, concurrency):
+    """Latencies in ms of count GETs spread over paths, concurrency at a time"""
+    urls = [base_url + paths[i % len(paths)] for i in range(count)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = list(executor.map(request, urls))
+    return latencies, (time.perf_counter() - start) * 1000
+
+
+def summarize(latencies, wall_ms):
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "p50_ms": round(statistics.median(ordered), 1),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1], 1),
+        "max_ms": round(ordered[-1], 1),
+        "wall_ms": round(wall_ms, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--hold", type=float, default=2.0, help="seconds the slow request waits in the database")
+    parser.add_argument("--requests", type=int, default=40, help="fast requests per burst")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--paths", default="/health,/categories")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+    paths = args.paths.split(",")
+
+    # Warm up connections and caches
+    burst(args.url, paths, len(paths) * 2, 1)
+    results = {"hold_s": args.hold, "paths": paths}
+    results["idle"] = summarize(*burst(args.url, paths, args.requests, args.concurrency))
+
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, category FROM transactions LIMIT 1")
+            row = cur.fetchone()
+            if row is None:
+                sys.exit("No transactions to lock; ingest some first")
+            transaction_id, category = row
+            # Writing the same category back leaves the data as it was
+            cur.execute("SELECT 1 FROM transactions WHERE id = %s FOR UPDATE", (transaction_id,))
+
+        slow = {}
+
+        def slow_request():
+            slow["ms"] = request(
+                args.url + "/transactions", {"id": transaction_id, "category": category or ""}
+            )
+
+        thread = threading.Thread(target=slow_request)
+        thread.start()
+        # Give the slow request time to reach the lock
+        time.sleep(0.2)
+        release = threading.Timer(args.hold, conn.rollback)
+        release.start()
+        results["during_slow_query"] = summarize(*burst(args.url, paths, args.requests, args.concurrency))
+        release.join()
+        thread.join()
+        results["slow_request_ms"] = round(slow.get("ms", 0), 1)
+    finally:
+        conn.close()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{args.requests} requests to {', '.join(paths)} at concurrency {args.concurrency}")
+    for name in ("idle", "during_slow_query"):
+        r = results[name]
+        print(f"  {name:18} p50 {r['p50_ms']:8.1f} ms  p95 {r['p95_ms']:8.1f} ms  "
+              f"max {r['max_ms']:8.1f} ms  wall {r['wall_ms']:8.1f} ms")
+    print(f"  slow POST /transactions took {results['slow_request_ms']} ms (held {args.hold}s)")
+
+
+if __name__ == "__main__":
+    main()
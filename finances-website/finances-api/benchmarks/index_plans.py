@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Compare query plans for the hot transactions queries before and after the
+schema migration indexes, on a large synthetic table.
+
+Runs in a scratch schema that is dropped afterwards, so it is safe against a live
+database:
+
+    python -m benchmarks.index_plans --rows 1000000
+"""
+import argparse
+import json
+import sys
+import time
+from scripts.db import connect
+from migrations.schema_migrations import MIGRATIONS
+
+SCHEMA = "bench_index_plans"
+
+CATEGORIES = ["", "food", "gas", "fun", "travel", "shopping", "payments", "housing", "work", "health"]
+
+QUERIES = {
+    "month_by_category": """
+        SELECT category, SUM(amount)
+        FROM transactions
+        WHERE year = 2024 AND month = 6
+        AND category NOT IN ('payments', 'housing') AND category != '' AND category IS NOT NULL
+        GROUP BY category
+    """,
+    "uncategorized": """
+        SELECT id, card_issuer, date, month, day, year, amount, vendor, category, line_id
+        FROM transactions
+        WHERE category = '' OR category IS NULL
+        ORDER BY date DESC
+    """,
+    "newest_page": """
+        SELECT id, card_issuer, date, month, day, year, amount, vendor, category, line_id
+        FROM transactions
+        ORDER BY date DESC, id DESC
+        LIMIT 100
+    """,
+}
+
+
+def build_table(cur, rows, uncategorized_share):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+    cur.execute("""
+        CREATE TABLE transactions (
+            id TEXT PRIMARY KEY,
+            card_issuer TEXT,
+            date DATE,
+            month INTEGER,
+            day INTEGER,
+            year INTEGER,
+            amount NUMERIC(10,2),
+            vendor TEXT,
+            category TEXT,
+            line_id INTEGER,
+            CONSTRAINT unique_transaction UNIQUE (card_issuer, line_id, date, vendor)
+        )
+    """)
+    # Ten years of history, with a small share of rows still waiting for a category
+    cur.execute("""
+        INSERT INTO transactions
+        SELECT
+            md5(g::text),
+            (ARRAY['Discover', 'amex_blue', 'capone_venture', 'citi_double'])[1 + g %% 4],
+            d,
+            EXTRACT(MONTH FROM d),
+            EXTRACT(DAY FROM d),
+            EXTRACT(YEAR FROM d),
+            round((random() * 200)::numeric, 2),
+            'Vendor ' || (g %% 5000),
+            CASE WHEN random() < %s THEN '' ELSE (%s::text[])[2 + g %% (array_length(%s::text[], 1) - 1)] END,
+            g
+        FROM (
+            SELECT g, DATE '2016-01-01' + (g %% 3650) AS d
+            FROM generate_series(1, %s) g
+        ) s
+    """, (uncategorized_share, CATEGORIES, CATEGORIES, rows))
+    cur.execute("VACUUM ANALYZE transactions")
+
+
+def explain(cur):
+    results = {}
+    for name, query in QUERIES.items():
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}")
+        plan = cur.fetchone()[0][0]
+        results[name] = {
+            "execution_ms": round(plan["Execution Time"], 2),
+            "planning_ms": round(plan["Planning Time"], 2),
+            "plan": summarize(plan["Plan"]),
+        }
+    return results
+
+
+def summarize(node, depth=0):
+    """One line per plan node, e.g. 'Index Scan using idx_transactions_date_desc'"""
+    line = "  " * depth + node["Node Type"]
+    if "Index Name" in node:
+        line += f" using {node['Index Name']}"
+    lines = [line]
+    for child in node.get("Plans", []):
+        lines.extend(summarize(child, depth + 1))
+    return lines
+
+
+def apply_indexes(cur):
+    # Only the index migration; the others touch tables the scratch schema doesn't have
+    for version, _, statements in MIGRATIONS:
+        if version != 1:
+            continue
+        for statement in statements:
+            cur.execute(statement)
+    cur.execute("VACUUM ANALYZE transactions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--uncategorized-share", type=float, default=0.01)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--keep", action="store_true", help="leave the scratch schema in place")
+    args = parser.parse_args()
+
+    conn = connect()
+    conn.autocommit = True
+    results = {"rows": args.rows}
+    try:
+        with conn.cursor() as cur:
+            start = time.perf_counter()
+            build_table(cur, args.rows, args.uncategorized_share)
+            results["build_s"] = round(time.perf_counter() - start, 2)
+
+            results["before"] = explain(cur)
+            start = time.perf_counter()
+            apply_indexes(cur)
+            results["index_build_s"] = round(time.perf_counter() - start, 2)
+            results["after"] = explain(cur)
+    finally:
+        if not args.keep:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{args.rows} synthetic transactions (built in {results['build_s']}s, indexes in {results['index_build_s']}s)")
+    for name in QUERIES:
+        before, after = results["before"][name], results["after"][name]
+        speedup = before["execution_ms"] / after["execution_ms"] if after["execution_ms"] else float("inf")
+        print(f"\n{name}: {before['execution_ms']} ms -> {after['execution_ms']} ms ({speedup:.1f}x)")
+        print("  before:")
+        for line in before["plan"]:
+            print(f"    {line}")
+        print("  after:")
+        for line in after["plan"]:
+            print(f"    {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Measure what logging costs the ingest, with the log written to a file.
+
+Two measurements, both with a line-buffered file as the sink, like a container's
+stderr with PYTHONUNBUFFERED=1:
+
+- Per-row output: five lines per row, as the row-by-row parser used to print,
+  written with print, then with logger.debug at INFO (disabled), at DEBUG with a
+  synchronous sink and at DEBUG with the buffered sink the API uses.
+- The parse step: every synthetic statement (benchmarks.statements) through
+  parse_file, plus a file with malformed rows through read_csv_file's
+  line-by-line reader, which logs each irregular row at TRACE. Levels are
+  interleaved round by round so drift doesn't favour one of them.
+
+    python -m benchmarks.logging_overhead --rows 20000
+"""
+import argparse
+import contextlib
+import os
+import random
+import tempfile
+import time
+from benchmarks.statements import LAYOUTS, generate_transactions, write_statements
+
+# (label, level, buffered)
+PARSE_CONFIGS = [
+    ("trace, synchronous", "TRACE", False),
+    ("debug, synchronous", "DEBUG", False),
+    ("info, synchronous", "INFO", False),
+    ("info, buffered", "INFO", True),
+]
+
+
+def write_malformed_statement(path, rows, share, seed=0):
+    """A Wells Fargo style file without quoting, where share of the vendors contain a comma"""
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("Date,Description,Amount\n")
+        for day, description, amount in generate_transactions(rows, seed=seed):
+            if rng.random() < share:
+                description = description.replace(" ", ", ", 1)
+            f.write(f"{day.strftime('%m/%d/%Y')},{description},{amount:.2f}\n")
+
+
+@contextlib.contextmanager
+def log_to(path, level, buffered):
+    """Point the app's logger at a line-buffered file for the duration"""
+    from scripts import log
+    from scripts.log import logger
+
+    with open(path, "w", buffering=1) as sink:
+        logger.remove()
+        stream = log.BufferedStream(sink) if buffered else sink
+        logger.add(stream, level=level, format=log._format, backtrace=False, diagnose=False)
+        try:
+            yield sink
+        finally:
+            # Waits for a buffered sink to drain, so its backlog is part of the timing
+            logger.remove()
+
+
+def emit_rows_print(transactions, sink):
+    for line_id, (day, description, amount) in enumerate(transactions):
+        print(f"Processing row: {day},{description},{amount}", file=sink)
+        print(f"Line id: {line_id}", file=sink)
+        print(f"Date parsed: {day}", file=sink)
+        print(f"Amount: {amount} -> {float(amount)}", file=sink)
+        print(f"Created transaction: {description} {amount}", file=sink)
+
+
+def emit_rows_logger(transactions):
+    from scripts.log import logger
+
+    for line_id, (day, description, amount) in enumerate(transactions):
+        logger.debug("Processing row: {},{},{}", day, description, amount)
+        logger.debug("Line id: {}", line_id)
+        logger.debug("Date parsed: {}", day)
+        logger.debug("Amount: {} -> {}", amount, float(amount))
+        logger.debug("Created transaction: {} {}", description, amount)
+
+
+def time_row_output(transactions, log_path):
+    """ms to emit five lines per row each way"""
+    results = {}
+    with open(log_path, "w", buffering=1) as sink:
+        start = time.perf_counter()
+        emit_rows_print(transactions, sink)
+        results["print"] = (time.perf_counter() - start) * 1000
+    for label, level, buffered in [
+        ("logger.debug, disabled", "INFO", False),
+        ("logger.debug, synchronous", "DEBUG", False),
+        ("logger.debug, buffered", "DEBUG", True),
+    ]:
+        start = time.perf_counter()
+        with log_to(log_path, level, buffered):
+            emit_rows_logger(transactions)
+        results[label] = (time.perf_counter() - start) * 1000
+    return results
+
+
+def run_parse(paths, malformed_path):
+    from scripts import transaction_parser
+
+    for path in paths.values():
+        transaction_parser.parse_file(path, {}, set(), {})
+    transaction_parser.read_csv_file(malformed_path)
+
+
+def time_parse(paths, malformed_path, log_path, repeat):
+    """Fastest parse per config, plus the lines and bytes it logged"""
+    times = {label: [] for label, _, _ in PARSE_CONFIGS}
+    sizes = {}
+    for _ in range(repeat):
+        for label, level, buffered in PARSE_CONFIGS:
+            start = time.perf_counter()
+            with log_to(log_path, level, buffered):
+                run_parse(paths, malformed_path)
+            times[label].append((time.perf_counter() - start) * 1000)
+            with open(log_path, "rb") as f:
+                sizes[label] = (sum(1 for _ in f), os.path.getsize(log_path))
+    return {label: (min(times[label]),) + sizes[label] for label in times}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000, help="transactions per statement")
+    parser.add_argument("--malformed", type=float, default=0.05, help="share of malformed rows in the extra file")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="finances_logging_") as directory:
+        log_path = os.path.join(directory, "api.log")
+
+        transactions = generate_transactions(args.rows, seed=args.seed)
+        print(f"Per-row output, 5 lines x {args.rows} rows, best of {args.repeat}")
+        rounds = [time_row_output(transactions, log_path) for _ in range(args.repeat)]
+        baseline = min(r["print"] for r in rounds)
+        for label in rounds[0]:
+            best = min(r[label] for r in rounds)
+            print(f"  {label:<28} {best:>9.1f} ms  {best * 1000 / args.rows:>7.2f} us/row  {baseline / best:>7.1f}x")
+
+        paths = write_statements(os.path.join(directory, "statements"), args.rows, list(LAYOUTS), args.seed)
+        malformed_path = os.path.join(directory, "malformed.csv")
+        write_malformed_statement(malformed_path, args.rows, args.malformed, args.seed)
+        # Warm up imports, the format cache and pandas before timing anything
+        with log_to(log_path, "WARNING", False):
+            run_parse(paths, malformed_path)
+
+        print(f"Parse step, {len(paths)} statements + 1 malformed file of {args.rows} rows, best of {args.repeat}")
+        for label, (best, lines, size) in time_parse(paths, malformed_path, log_path, args.repeat).items():
+            print(f"  {label:<28} {best:>9.1f} ms  {lines:>8} lines  {size / 1e6:>7.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Write synthetic card statements in every layout the ingest understands.
+
+Each file looks like a real export from its issuer: the same header, date format,
+amount style (signed amounts, Capital One's debit/credit columns, Citi's "$ 1.00"
+in tab-padded columns) and vendor descriptions with store numbers and locations,
+newest transaction first. Output is deterministic for a given seed:
+
+    python -m benchmarks.statements --rows 100000 --out /tmp/statements
+"""
+import argparse
+import csv
+import os
+import random
+import time
+from datetime import date, timedelta
+
+VENDORS = [
+    ("SMITHS FOOD #{n} SALT LAKE CIT UT", 20, 180),
+    ("HARMONS {n} SALT LAKE CITY UT", 10, 120),
+    ("COSTCO WHSE #{n} MURRAY UT", 40, 400),
+    ("TRADER JOE S #{n} SALT LAKE CIT UT", 15, 110),
+    ("AMAZON MKTPL*{code} Amzn.com/bill WA", 8, 150),
+    ("AMAZON.COM*{code} AMZN.COM/BILL WA", 8, 150),
+    ("TARGET {n} SOUTH SALT LAK UT", 10, 160),
+    ("CHEVRON {n} SALT LAKE CITY UT", 25, 75),
+    ("MAVERIK #{n} DRAPER UT", 20, 70),
+    ("SMITHS FUEL #{n} SALT LAKE CIT UT", 25, 70),
+    ("TST* HASH KITCHEN - SALT LAKE CITY UT", 18, 90),
+    ("CHIPOTLE {n} SALT LAKE CITY UT", 10, 35),
+    ("IN-N-OUT SALT LAKE CITY #{n} UT", 8, 30),
+    ("STARBUCKS STORE {n} SALT LAKE CITY UT", 4, 18),
+    ("SQ *BLUE COPPER COFFEE Salt Lake City UT", 4, 16),
+    ("DELTA AIR LINES ATLANTA", 120, 900),
+    ("AIRBNB * {code} AIRBNB.COM CA", 90, 1200),
+    ("UBER *TRIP HELP.UBER.COM CA", 9, 60),
+    ("NETFLIX.COM LOS GATOS CA", 15, 23),
+    ("SPOTIFY USA NEW YORK NY", 11, 17),
+    ("PETS BEST INSURANCE SERV", 25, 26),
+    ("STATE FARM INSURANCE BLOOMINGTON IL", 90, 140),
+    ("ROCKY MTN POWER 888-221-7070 OR", 40, 160),
+    ("DOMINION ENERGY UTAH 800-323-5517 UT", 30, 140),
+    ("LOWE'S OF S.W. AUSTIN (B AUSTIN TX", 15, 300),
+    ("THE HOME DEPOT #{n} SALT LAKE CITY UT", 15, 300),
+    ("REI #{n} SALT LAKE CITY UT", 30, 350),
+    ("WWW.ONXMAPS.COM", 16, 30),
+    ("PRIMARY CHILDRENS HOSPITA", 6, 400),
+    ("WALGREENS #{n} SALT LAKE CITY UT", 5, 60),
+]
+# A few vendors account for most purchases, like a real statement
+VENDOR_WEIGHTS = [1 / (rank + 1) for rank in range(len(VENDORS))]
+PAYMENTS = [
+    "AUTOPAY {code}RAUTOPAY AUTO-PMT",
+    "ONLINE PAYMENT - THANK YOU",
+    "INTERNET PAYMENT THANK YOU",
+]
+CAPONE_CATEGORIES = ["Dining", "Merchandise", "Gas/Automotive", "Healthcare", "Insurance", "Entertainment", "Other Travel"]
+DISCOVER_CATEGORIES = ["Supermarkets", "Restaurants", "Gasoline", "Merchandise", "Travel/ Entertainment", "Services"]
+CARD_MEMBERS = ["SHANE T LOCKHOOF", "KEARA LOCKHOOF"]
+
+
+def generate_transactions(rows, seed=0, end=None):
+    """
+    (date, description, amount) tuples, newest first, spread over the days before
+    end. Amounts are positive for purchases and negative for payments and refunds.
+    """
+    rng = random.Random(seed)
+    end = end or date.today()
+    # Roughly six purchases a day, so larger statements reach further back (up to ten years)
+    days = min(3650, max(30, rows // 6))
+    out = []
+    for _ in range(rows):
+        day = end - timedelta(days=int(rng.random() * days))
+        roll = rng.random()
+        if roll < 0.03:
+            description = rng.choice(PAYMENTS).format(code=rng.randrange(10 ** 14, 10 ** 15))
+            amount = -round(rng.uniform(50, 3000), 2)
+        else:
+            template, low, high = rng.choices(VENDORS, VENDOR_WEIGHTS)[0]
+            description = template.format(n=rng.randrange(1000, 9999), code=f"{rng.randrange(16 ** 8):08X}")
+            amount = round(rng.uniform(low, high), 2)
+            if roll > 0.995:
+                amount = -amount
+        out.append((day, description, amount))
+    out.sort(key=lambda t: t[0], reverse=True)
+    return out
+
+
+def write_discover(f, transactions, rng):
+    writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+    writer.writerow(["Trans. Date", "Post Date", "Description", "Amount", "Category"])
+    for day, description, amount in transactions:
+        posted = day + timedelta(days=rng.randrange(0, 3))
+        category = "Payments and Credits" if amount < 0 else rng.choice(DISCOVER_CATEGORIES)
+        writer.writerow([day.strftime("%m/%d/%Y"), posted.strftime("%m/%d/%Y"), description, amount, category])
+
+
+def write_amex(f, transactions, rng, card_members):
+    writer = csv.writer(f, lineterminator="\n")
+    if card_members:
+        writer.writerow(["Date", "Description", "Card Member", "Account #", "Amount"])
+    else:
+        writer.writerow(["Date", "Description", "Amount"])
+    for day, description, amount in transactions:
+        # AMEX pads the merchant name and the city into fixed-width fields
+        padded = f"{description[:20]:<20}{description[20:]:<20}"
+        if card_members:
+            writer.writerow([day.strftime("%m/%d/%Y"), padded, rng.choice(CARD_MEMBERS), -21003, f"{amount:.2f}"])
+        else:
+            writer.writerow([day.strftime("%m/%d/%Y"), padded, f"{amount:.2f}"])
+
+
+def write_capone(f, transactions, rng):
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(["Transaction Date", "Posted Date", "Card No.", "Description", "Category", "Debit", "Credit"])
+    card = rng.randrange(1000, 9999)
+    for day, description, amount in transactions:
+        posted = day + timedelta(days=rng.randrange(0, 3))
+        if amount < 0:
+            row = [description, "Payment/Credit", "", f"{-amount:.2f}"]
+        else:
+            row = [description, rng.choice(CAPONE_CATEGORIES), f"{amount:.2f}", ""]
+        writer.writerow([day.isoformat(), posted.isoformat(), card] + row)
+
+
+def write_citi(f, transactions, rng):
+    # Tab-padded columns with a variable number of tabs between them
+    f.write("\tStatus\t\tDate\t\t\tDescription\t\t\tAmount\t\n")
+    for day, description, amount in transactions:
+        money = f" -$ {-amount:.2f}" if amount < 0 else f"$ {amount:.2f}"
+        f.write(f"\tCleared\t\t{day.strftime('%m/%d/%Y')}\t\t{description}\t\t\t{money}\t\n")
+
+
+def write_wells_fargo(f, transactions, rng):
+    writer = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerow(["Date", "Description", "Amount"])
+    for day, description, amount in transactions:
+        writer.writerow([day.strftime("%m/%d/%Y"), description, f"{amount:.2f}"])
+
+
+# File name -> writer; the names carry the keywords format detection and card names key on
+LAYOUTS = {
+    "discover.csv": write_discover,
+    "amex_blue.csv": lambda f, t, rng: write_amex(f, t, rng, card_members=True),
+    "amex_delta.csv": lambda f, t, rng: write_amex(f, t, rng, card_members=False),
+    "capone_venture.csv": write_capone,
+    "capone_venture_x.csv": write_capone,
+    "citi_double.csv": write_citi,
+    "citi_custom.TXT": write_citi,
+    "wellsfargo.csv": write_wells_fargo,
+    "bilt.csv": write_wells_fargo,
+}
+
+
+def write_statements(directory, rows, layouts=None, seed=0):
+    """Write one statement of rows transactions per layout; returns {file name: path}"""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for i, name in enumerate(layouts or LAYOUTS):
+        rng = random.Random(seed * 1000 + i)
+        transactions = generate_transactions(rows, seed=seed * 1000 + i)
+        path = os.path.join(directory, name)
+        with open(path, "w", newline="") as f:
+            LAYOUTS[name](f, transactions, rng)
+        paths[name] = path
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="transactions per statement")
+    parser.add_argument("--out", default="./bench_statements")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS), help="comma-separated file names")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = write_statements(args.out, args.rows, args.layouts.split(","), args.seed)
+    for name, path in paths.items():
+        print(f"{path}: {args.rows} rows, {os.path.getsize(path) / 1e6:.1f} MB")
+    print(f"Wrote {len(paths)} statements in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Time the ingest and dashboard paths on synthetic statements of several sizes.
+
+For each size it writes one statement per card layout (benchmarks.statements) and
+times read_csv_file and parse on every file, parse_transactions end to end over the
+whole directory (a cold run that loads every row, then a warm run that finds every
+file already checkpointed), and the read endpoints against the data just loaded.
+Everything runs against a throwaway database created on the configured server and
+dropped afterwards, and the API is served in-process by uvicorn.
+
+Results are written as JSON so runs on two commits can be compared:
+
+    python -m benchmarks.suite --rows 1000,10000,100000 --output before.json
+    python -m benchmarks.suite --rows 1000,10000,100000 --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+import psycopg2
+from benchmarks.statements import LAYOUTS, write_statements
+
+CATEGORIES = ["food", "gas", "fun", "travel", "shopping", "health", "utilities", "payments", "housing", "work"]
+
+# Paths timed after each ingest; {month} and {year} are last month's
+ENDPOINTS = [
+    "/spending/thismonth",
+    "/spending/lastmonth",
+    "/spending/specific/{month}/{year}",
+    "/spending/yeartodate",
+    "/spending/yeartodate/categorized",
+    "/spending/yeartodate/realtivetoincome",
+    "/networth",
+    "/dashboard",
+    "/transactions",
+    "/transactions?limit=1000",
+    "/transactions/uncategorized",
+]
+
+# Data tables emptied before each cold ingest
+INGEST_TABLES = ["transactions", "misformatted_transactions", "transaction_processing_state", "monthly_category_totals"]
+
+
+def admin_connect(dbname):
+    """Connection with the same settings as scripts.db, which must not be imported yet"""
+    return psycopg2.connect(
+        dbname=dbname,
+        user=os.getenv("POSTGRES_USER", "finances"),
+        password=os.getenv("POSTGRES_PASSWORD", ""),
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432")
+    )
+
+
+@contextlib.contextmanager
+def throwaway_database(keep=False):
+    """Create an empty database and point the app's settings at it"""
+    source = os.getenv("POSTGRES_DB", "finances")
+    name = f"finances_bench_{os.getpid()}"
+    conn = admin_connect(source)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE DATABASE {name}")
+        os.environ["POSTGRES_DB"] = name
+        yield name
+    finally:
+        os.environ["POSTGRES_DB"] = source
+        if not keep:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        conn.close()
+
+
+@contextlib.contextmanager
+def api_server():
+    """Serve the app on a free local port from a background thread; yields its base URL"""
+    import uvicorn
+    from main import app
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        thread.start()
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("API server failed to start")
+            time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def seed_reference_data(cur):
+    """Categories, budget and two years of income, rent, transfers and net worth"""
+    cur.execute("ALTER TABLE transactions ADD CONSTRAINT unique_transaction UNIQUE (card_issuer, line_id, date, vendor)")
+    for rank, name in enumerate(CATEGORIES, start=1):
+        cur.execute("INSERT INTO categories (name, rank) VALUES (%s, %s)", (name, rank))
+        cur.execute("INSERT INTO budget (category, amount) VALUES (%s, %s)", (name, 100 * rank))
+    this_year = datetime.now().year
+    for year in (this_year - 1, this_year):
+        for month in range(1, 13):
+            month_name = datetime(year, month, 1).strftime("%B")
+            cur.execute("INSERT INTO income (year, month, amount) VALUES (%s, %s, %s)", (year, month_name, 7500))
+            cur.execute("INSERT INTO rent (year, month, amount) VALUES (%s, %s, %s)", (year, month_name, 1800))
+            cur.execute(
+                "INSERT INTO net_worth (year, month, savings, investments) VALUES (%s, %s, %s, %s)",
+                (str(year), month_name, 20000 + 500 * month, 90000 + 1500 * month)
+            )
+            cur.execute(
+                "INSERT INTO money_transfers (id, date, year, month, amount, type, description) "
+                "VALUES (%s, %s, %s, %s, %s, 'transfer', 'savings')",
+                (f"{year}-{month}", datetime(year, month, 15), str(year), month, 400)
+            )
+
+
+def best_of(repeat, fn):
+    """Fastest of repeat runs in ms, with anything the app prints silenced"""
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = fn()
+            times.append((time.perf_counter() - start) * 1000)
+    return round(min(times), 2), result
+
+
+def time_parsing(paths, repeat):
+    from scripts import card_formats, transaction_parser
+
+    results = {}
+    for name, path in paths.items():
+        card_format = card_formats.detect_format(path)
+        read_ms, (df, _) = best_of(repeat, lambda: transaction_parser.read_csv_file(path, card_format=card_format))
+        parse_ms, parsed = best_of(repeat, lambda: transaction_parser.parse(
+            df,
+            card_format.card_name_for(name),
+            card_format.date_key,
+            card_format.date_format,
+            card_format.debit_key,
+            card_format.vendor_key,
+            card_format.credit_key,
+        ))
+        results[name] = {"rows": len(parsed), "read_csv_file_ms": read_ms, "parse_ms": parse_ms}
+    return results
+
+
+def time_ingest(directory):
+    from scripts import categorizer, rollup, transaction_parser
+    from scripts.db import connect
+
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"TRUNCATE {', '.join(INGEST_TABLES)}")
+        conn.commit()
+        categorizer.reset_categorizer()
+
+        os.environ["TRANSACTION_DATA_PATH"] = directory
+        results = {}
+        for run in ("cold", "warm"):
+            ms, summary = best_of(1, lambda: asyncio.run(transaction_parser.parse_transactions()))
+            results[f"{run}_ms"] = ms
+            results[f"{run}_summary"] = summary
+
+        # Categorize all but ~3% of the rows so the spending views have data to sum
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE transactions
+                SET category = (%s::text[])[1 + abs(hashtext(vendor)) %% %s]
+                WHERE abs(hashtext(id)) %% 100 >= 3
+            """, (CATEGORIES, len(CATEGORIES)))
+            rollup.rebuild(cur)
+            cur.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    return results
+
+
+def time_endpoints(base_url, requests):
+    now = datetime.now()
+    last_month = (now.month - 2) % 12 + 1
+    year = now.year if now.month > 1 else now.year - 1
+
+    results = {}
+    for path in ENDPOINTS:
+        url = base_url + path.format(month=last_month, year=year)
+        latencies = []
+        size = 0
+        for _ in range(requests + 1):
+            start = time.perf_counter()
+            with urllib.request.urlopen(url, timeout=300) as response:
+                size = len(response.read())
+            latencies.append((time.perf_counter() - start) * 1000)
+        # The first request warms the reference cache and the connection pool
+        latencies = sorted(latencies[1:])
+        results[path] = {
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 2),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+            "bytes": size,
+        }
+    return results
+
+
+def describe_environment(dbname):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain"], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    import pandas
+    conn = admin_connect(dbname)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version")
+            postgres = cur.fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pandas.__version__,
+        "postgres": postgres,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def flatten(results):
+    """{"1000/parsing/discover.csv/parse_ms": 1.2, ...} for every timing in a results file"""
+    metrics = {}
+
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                walk(f"{prefix}/{key}" if prefix else key, child)
+        elif isinstance(value, (int, float)) and prefix.endswith("_ms"):
+            metrics[prefix] = value
+
+    walk("", results["sizes"])
+    return metrics
+
+
+def compare(baseline, current, threshold):
+    """Print every timing that moved by more than threshold; returns the regressions"""
+    before, after = flatten(baseline), flatten(current)
+    regressions = []
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'} (threshold {threshold:.2f}x):")
+    for metric in sorted(before.keys() & after.keys()):
+        old, new = before[metric], after[metric]
+        if old <= 0 or new <= 0:
+            continue
+        ratio = new / old
+        if ratio >= threshold or ratio <= 1 / threshold:
+            marker = "slower" if ratio > 1 else "faster"
+            print(f"  {metric}: {old} -> {new} ms ({ratio:.2f}x {marker})")
+            if ratio > 1:
+                regressions.append(metric)
+    if not regressions:
+        print("  no regressions")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="1000,10000,100000",
+                        help="comma-separated statement sizes, rows per layout (e.g. 1000,100000,1000000)")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS), help="comma-separated statement file names")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of read_csv_file and parse; the fastest counts")
+    parser.add_argument("--requests", type=int, default=20, help="requests per endpoint")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio that counts as a change when comparing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the throwaway database and statements")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.rows.split(",")]
+    layouts = args.layouts.split(",")
+
+    # The ingest runs in the foreground; the worker would race it
+    os.environ["INGEST_WORKER_ENABLED"] = "false"
+    # Keep the app's per-file progress off the results (LOG_LEVEL=INFO shows it)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    workdir = tempfile.mkdtemp(prefix="finances_bench_")
+    results = {"sizes": {}}
+    with throwaway_database(args.keep) as dbname:
+        results["meta"] = describe_environment(dbname)
+        results["meta"].update({"layouts": layouts, "repeat": args.repeat, "requests": args.requests, "seed": args.seed})
+
+        with api_server() as base_url:
+            conn = admin_connect(dbname)
+            with conn, conn.cursor() as cur:
+                seed_reference_data(cur)
+            conn.close()
+
+            for rows in sizes:
+                print(f"\n{rows} rows per statement x {len(layouts)} layouts")
+                directory = os.path.join(workdir, str(rows))
+                start = time.perf_counter()
+                paths = write_statements(directory, rows, layouts, args.seed)
+                print(f"  generated in {time.perf_counter() - start:.1f}s")
+
+                size_results = {"parsing": time_parsing(paths, args.repeat)}
+                for name, timing in size_results["parsing"].items():
+                    print(f"  {name:22} read_csv_file {timing['read_csv_file_ms']:9.1f} ms  parse {timing['parse_ms']:9.1f} ms")
+
+                size_results["parse_transactions"] = time_ingest(directory)
+                ingest = size_results["parse_transactions"]
+                print(f"  parse_transactions     cold {ingest['cold_ms']:9.1f} ms  warm {ingest['warm_ms']:9.1f} ms")
+
+                # Also silences uvicorn's access log, which shares this process's stdout
+                with contextlib.redirect_stdout(io.StringIO()):
+                    size_results["endpoints"] = time_endpoints(base_url, args.requests)
+                for path, timing in size_results["endpoints"].items():
+                    print(f"  {path:40} p50 {timing['p50_ms']:8.1f} ms  p95 {timing['p95_ms']:8.1f} ms  {timing['bytes']:>10} B")
+                results["sizes"][str(rows)] = size_results
+
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Measure what parsed transactions cost in memory and on the way into COPY.
+
+Every synthetic statement (benchmarks.statements) is parsed with parse_frame and
+the batches concatenated, as store_results does. The same rows are then held
+three ways: the TransactionBatch, a DataFrame with TRANSACTION_COLUMNS (what the
+parser used to return) and a list of TransactionData, and each is timed through
+bulk_load's CSV serialization where that applies. Nothing touches the database.
+
+    python -m benchmarks.transaction_batch --rows 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from benchmarks.statements import LAYOUTS, write_statements
+
+
+def parse_statements(paths):
+    from scripts import card_formats, transaction_parser
+    from models.transactions import TransactionBatch
+
+    batches = []
+    for name, path in paths.items():
+        card_format = card_formats.detect_format(path)
+        df, _ = transaction_parser.read_csv_file(path, card_format=card_format)
+        if card_format.strip_whitespace:
+            df = card_formats.strip_frame(df)
+        batch, _ = transaction_parser.parse_frame(
+            df,
+            card_format.card_name_for(name),
+            card_format.date_key,
+            card_format.date_format,
+            card_format.debit_key,
+            card_format.vendor_key,
+            card_format.credit_key,
+        )
+        batches.append(batch)
+    return TransactionBatch.concat(batches)
+
+
+def to_frame(batch):
+    import pandas as pd
+    from scripts.bulk_load import TRANSACTION_COLUMNS
+
+    return pd.DataFrame({
+        "id": batch.ids.astype(str).astype(object),
+        "card_issuer": batch.card_issuers[batch.issuer_codes],
+        "date": batch.dates.astype("datetime64[ns]"),
+        "month": batch.months,
+        "day": batch.days,
+        "year": batch.years,
+        "amount": batch.amounts,
+        "vendor": batch.vendors[batch.vendor_codes],
+        "category": batch.categories,
+        "line_id": batch.line_ids,
+    })[TRANSACTION_COLUMNS]
+
+
+def traced_bytes(build):
+    """Bytes still allocated by build()'s result"""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def best_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000, help="transactions per statement")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from scripts import bulk_load
+
+    with tempfile.TemporaryDirectory(prefix="finances_batch_") as directory:
+        paths = write_statements(os.path.join(directory, "statements"), args.rows, list(LAYOUTS), args.seed)
+        batch = parse_statements(paths)
+    rows = len(batch)
+    frame = to_frame(batch)
+    objects_bytes, objects = traced_bytes(lambda: list(batch))
+
+    print(f"{rows} transactions from {len(paths)} statements, {len(batch.vendors)} distinct vendors")
+    print("Memory per row")
+    print(f"  {'TransactionBatch':<22} {batch.nbytes / rows:>8.1f} B")
+    print(f"  {'DataFrame':<22} {frame.memory_usage(deep=True).sum() / rows:>8.1f} B")
+    print(f"  {'list[TransactionData]':<22} {objects_bytes / rows:>8.1f} B")
+
+    print(f"COPY buffer, best of {args.repeat}")
+    for label, rows_in in (("TransactionBatch", batch), ("DataFrame", frame)):
+        ms = best_ms(lambda: bulk_load._to_csv_buffer(rows_in, bulk_load.TRANSACTION_COLUMNS), args.repeat)
+        print(f"  {label:<22} {ms:>8.1f} ms")
+
+    first, second = objects[0], objects[1]
+    compares = 100000
+    ms = best_ms(lambda: [first == second for _ in range(compares)], args.repeat)
+    print(f"TransactionData.__eq__  {ms * 1000 / compares:>8.2f} us per compare")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,27 @@
 import time
-from uuid import uuid4
 import os
 
-from fastapi import FastAPI, Request, status, Depends
+from fastapi import FastAPI, Request, Response, status, Depends
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import database module
-from scripts.db import get_db_connection
+from scripts.db import get_db_connection, init_pool, close_pool, get_pool_stats
+from scripts.async_db import get_async_db_connection, init_async_pool, close_async_pool, get_async_pool_stats
+from scripts.reference_cache import get_cache_stats
+from scripts.ingest_worker import start_ingest_worker, stop_ingest_worker
+from scripts import metrics, query_stats, rollup
+from scripts.log import logger
+from migrations.schema_migrations import apply_migrations
 import psycopg2
 from dotenv import load_dotenv
 
 from routers import (
+    admin,
     budget,
     categories,
+    dashboard,
     money_schedule,
     money_transfers,
     net_worth,
@@ -46,8 +53,10 @@ app.add_middleware(
 )
 
 # Include routers
+app.include_router(admin.router, tags=["Admin"])
 app.include_router(budget.router, tags=["Budget"])
 app.include_router(categories.router, tags=["Categories"])
+app.include_router(dashboard.router, tags=["Dashboard"])
 app.include_router(money_schedule.router, tags=["Money Schedule"])
 app.include_router(money_transfers.router, tags=["Money Transfers"])
 app.include_router(net_worth.router, tags=["Net Worth"])
@@ -58,18 +67,31 @@ app.include_router(spending.router, tags=["Spending"])
 app.include_router(transactions.router, tags=["Transactions"])
 
 @app.middleware("http")
-async def log_requests(request: Request, call_next):
-    rid = uuid4()
-    start_time = time.time()
-
-    response = await call_next(request)
-
-    process_time = int((time.time() - start_time) * 1000)
-    
-    # Enhanced logging
-    print(f"Request {rid}: {request.method} {request.url.path} - {response.status_code} - {process_time}ms")
-
-    return response
+async def record_request_metrics(request: Request, call_next):
+    """Request latency and in-flight counts for GET /metrics"""
+    # Lets the query stats attribute each statement to its route
+    query_stats.request_scope.set(request.scope)
+    method = request.method
+    metrics.http_requests_in_flight.inc(method)
+    start_time = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        metrics.http_requests_in_flight.dec(method)
+        # Label by the route template (/transactions/ingest/jobs/{job_id}), not the
+        # path, so ids don't create a new series each; unmatched paths share one
+        route = request.scope.get("route")
+        elapsed = time.perf_counter() - start_time
+        metrics.http_request_duration_seconds.observe(
+            method,
+            route.path if route is not None else "unmatched",
+            status_code,
+            value=elapsed
+        )
+        logger.debug("{} {} - {} - {:.0f}ms", method, request.url.path, status_code, elapsed * 1000)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -84,7 +106,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
     """Handle general exceptions."""
-    print(f"Unhandled exception: {str(exc)}")
+    logger.opt(exception=exc).error("Unhandled exception on {} {}: {}", request.method, request.url.path, exc)
     content = {"status_code": 500, "message": "Internal server error", "data": None}
     return JSONResponse(
         content=content, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -92,23 +114,29 @@ async def generic_exception_handler(request: Request, exc: Exception):
 
 # Add health check endpoint
 @app.get("/health", tags=["Health"])
-async def health_check(conn = Depends(get_db_connection)):
+async def health_check(conn = Depends(get_async_db_connection)):
     """Health check endpoint to verify API and database are working"""
     try:
         # Test database connection
-        with conn.cursor() as cur:
-            cur.execute("SELECT 1")
-            result = cur.fetchone()
-            db_status = "connected" if result and result[0] == 1 else "error"
+        result = await conn.fetchval("SELECT 1")
+        db_status = "connected" if result == 1 else "error"
     except Exception as e:
         db_status = f"error: {str(e)}"
     
     return {
         "status": "healthy",
         "database": db_status,
+        "pool": get_pool_stats(),
+        "async_pool": get_async_pool_stats(),
+        "reference_cache": get_cache_stats(),
         "timestamp": time.time()
     }
 
+@app.get("/metrics", tags=["Health"])
+async def get_metrics():
+    """Request, database, pool and ingest metrics in the Prometheus text format"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # Add database initialization on startup
 @app.on_event("startup")
 async def startup_db_client():
@@ -240,14 +268,53 @@ async def startup_db_client():
                 last_line INTEGER
             )
             """)
+            cur.execute("""
+            ALTER TABLE transaction_processing_state
+                ADD COLUMN IF NOT EXISTS file_name TEXT,
+                ADD COLUMN IF NOT EXISTS file_hash TEXT,
+                ADD COLUMN IF NOT EXISTS rows_hash TEXT,
+                ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP
+            """)
+            
+            # Created ahead of the migrations so it gets a change counter
+            rollup.create_table(cur)
+            
+            # Indexes and other versioned schema changes
+            applied = apply_migrations(conn)
+            if applied:
+                logger.info("Applied schema migrations: {}", applied)
+            
+            # Monthly category rollup read by the spending dashboards
+            buckets = rollup.rebuild_if_empty(cur)
+            if buckets:
+                logger.info("Backfilled monthly_category_totals with {} buckets", buckets)
             
         # Close connection
         conn.close()
         
-        print("Database tables initialized successfully")
+        logger.info("Database tables initialized successfully")
         
     except Exception as e:
-        print(f"Error initializing database: {str(e)}")
+        logger.error("Error initializing database: {}", e)
+
+    try:
+        init_pool()
+    except Exception as e:
+        logger.error("Error initializing database pool: {}", e)
+
+    try:
+        await init_async_pool()
+    except Exception as e:
+        logger.error("Error initializing async database pool: {}", e)
+
+    start_ingest_worker()
+
+@app.on_event("shutdown")
+async def shutdown_db_client():
+    """Stop the ingest worker and close pooled database connections"""
+    await stop_ingest_worker()
+    close_pool()
+    await close_async_pool()
 
 if __name__ == "__main__":
     import uvicorn
@@ -5,6 +5,11 @@ from datetime import datetime
 import os
 import sys
 from dotenv import load_dotenv
+from schema_migrations import apply_migrations
+
+# The rollup table and its rebuild live in scripts/rollup.py, next to the code that maintains it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts import rollup
 
 # Load environment variables
 load_dotenv()
@@ -137,6 +142,16 @@ def create_tables(conn):
         );
         """)
         
+        cur.execute("""
+        ALTER TABLE transaction_processing_state
+            ADD COLUMN IF NOT EXISTS file_name TEXT,
+            ADD COLUMN IF NOT EXISTS file_hash TEXT,
+            ADD COLUMN IF NOT EXISTS rows_hash TEXT,
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+        """)
+        
+        rollup.create_table(cur)
+        
     print("Tables created successfully")
 
 def migrate_transactions(conn):
@@ -420,7 +435,7 @@ def migrate_last_line(conn):
                     cur.execute("""
                     INSERT INTO transaction_processing_state (card_name, last_line)
                     VALUES (%s, %s)
-                    ON CONFLICT (card_name) DO UPDATE SET last_line = EXCLUDED.last_line
+                    ON CONFLICT (card_name, file_name) DO UPDATE SET last_line = EXCLUDED.last_line
                     """, (card, line))
                 except Exception as e:
                     print(f"Error inserting last line for {card}: {str(e)}")
@@ -429,6 +444,14 @@ def migrate_last_line(conn):
     except Exception as e:
         print(f"Error migrating last line: {str(e)}")
 
+def rebuild_monthly_totals(conn):
+    """Recompute the monthly category rollup from the migrated transactions"""
+    try:
+        with conn.cursor() as cur:
+            print(f"Rebuilt {rollup.rebuild(cur)} monthly category totals")
+    except Exception as e:
+        print(f"Error rebuilding monthly category totals: {str(e)}")
+
 def main():
     print("Starting database migration...")
     
@@ -437,6 +460,7 @@ def main():
     
     # Create tables
     create_tables(conn)
+    apply_migrations(conn)
     
     # Migrate data
     migrate_transactions(conn)
@@ -449,6 +473,7 @@ def main():
     migrate_money_transfers(conn)
     migrate_net_worth(conn)
     migrate_last_line(conn)
+    rebuild_monthly_totals(conn)
     
     # Close connection
     conn.close()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Versioned schema changes for the finances database.
+
+Each migration runs once, in order, and is recorded in schema_migrations. Pending
+migrations are applied in a single transaction, so a failure leaves the schema as
+it was. Add new changes by appending to MIGRATIONS; never edit one that has
+already shipped.
+"""
+# loguru directly, since migrations.py imports this module outside the app package
+from loguru import logger
+
+MIGRATIONS = [
+    (
+        1,
+        "transactions query indexes",
+        [
+            # Month/category filters and GROUP BY (spending, rollup rebuilds)
+            """
+            CREATE INDEX IF NOT EXISTS idx_transactions_year_month_category
+            ON transactions (year, month, category) INCLUDE (amount)
+            """,
+            # /transactions/uncategorized
+            """
+            CREATE INDEX IF NOT EXISTS idx_transactions_uncategorized
+            ON transactions (date DESC)
+            WHERE category = '' OR category IS NULL
+            """,
+            # Newest-first listings, with id as the tie breaker
+            """
+            CREATE INDEX IF NOT EXISTS idx_transactions_date_desc
+            ON transactions (date DESC, id DESC)
+            """,
+        ],
+    ),
+    (
+        2,
+        "category rules",
+        [
+            # Explicit vendor -> category rules for the ingest categorizer
+            """
+            CREATE TABLE IF NOT EXISTS category_rules (
+                id SERIAL PRIMARY KEY,
+                pattern TEXT NOT NULL,
+                match_type TEXT NOT NULL DEFAULT 'contains'
+                    CHECK (match_type IN ('exact', 'prefix', 'contains')),
+                category TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT NOW(),
+                CONSTRAINT unique_category_rule UNIQUE (pattern, match_type)
+            )
+            """,
+        ],
+    ),
+    (
+        3,
+        "table change counters",
+        [
+            # One counter per table, read by the API to build ETags
+            """
+            CREATE TABLE IF NOT EXISTS table_versions (
+                table_name TEXT PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0,
+                changed_at TIMESTAMP DEFAULT NOW()
+            )
+            """,
+            # Bumped once per writing statement, and only visible once it commits
+            """
+            CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+            BEGIN
+                UPDATE table_versions
+                SET version = version + 1, changed_at = NOW()
+                WHERE table_name = TG_TABLE_NAME;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            # Tables that don't exist yet get no counter, so their responses get no ETag
+            """
+            DO $$
+            DECLARE
+                tracked TEXT;
+            BEGIN
+                FOREACH tracked IN ARRAY ARRAY[
+                    'transactions', 'misformatted_transactions', 'monthly_category_totals',
+                    'categories', 'category_rules', 'budget', 'income', 'rent',
+                    'money_transfers', 'money_schedule', 'net_worth', 'stock_vesting_schedule'
+                ] LOOP
+                    IF to_regclass(tracked) IS NOT NULL THEN
+                        INSERT INTO table_versions (table_name) VALUES (tracked)
+                        ON CONFLICT (table_name) DO NOTHING;
+                        EXECUTE format('DROP TRIGGER IF EXISTS %I_version ON %I', tracked, tracked);
+                        EXECUTE format(
+                            'CREATE TRIGGER %I_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                            'FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()',
+                            tracked, tracked
+                        );
+                    END IF;
+                END LOOP;
+            END
+            $$
+            """,
+        ],
+    ),
+    (
+        4,
+        "bump table counters at commit",
+        [
+            # Tables written by open transactions, waiting for their commit. No unique
+            # key, so concurrent writers never wait on each other here
+            """
+            CREATE TABLE IF NOT EXISTS table_version_changes (
+                txid BIGINT NOT NULL DEFAULT txid_current(),
+                table_name TEXT NOT NULL
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_table_version_changes_txid
+            ON table_version_changes (txid)
+            """,
+            # The statement triggers from migration 3 now only note the table. Updating
+            # table_versions here held its row lock until commit, which serialized every
+            # writer to a table and could deadlock against the rollup upserts
+            """
+            CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO table_version_changes (table_name) VALUES (TG_TABLE_NAME);
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            # Runs as the transaction commits: every table it wrote is bumped once, in
+            # name order so concurrent commits take the counter locks in the same order.
+            # Later firings in the same transaction find nothing left to do
+            """
+            CREATE OR REPLACE FUNCTION flush_table_versions() RETURNS trigger AS $$
+            DECLARE
+                changed TEXT;
+            BEGIN
+                FOR changed IN
+                    SELECT DISTINCT table_name FROM table_version_changes
+                    WHERE txid = txid_current()
+                    ORDER BY table_name
+                LOOP
+                    UPDATE table_versions
+                    SET version = version + 1, changed_at = NOW()
+                    WHERE table_name = changed;
+                END LOOP;
+                DELETE FROM table_version_changes WHERE txid = txid_current();
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            "DROP TRIGGER IF EXISTS table_version_changes_flush ON table_version_changes",
+            """
+            CREATE CONSTRAINT TRIGGER table_version_changes_flush
+            AFTER INSERT ON table_version_changes
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION flush_table_versions()
+            """,
+        ],
+    ),
+    (
+        5,
+        "per-file parse checkpoints",
+        [
+            # Several files map to one card (citi_custom.TXT and .csv), so a checkpoint
+            # per card had each file overwrite the other's hashes. Rows from
+            # last_line.json predate file names and are kept under ''
+            "UPDATE transaction_processing_state SET file_name = '' WHERE file_name IS NULL",
+            """
+            ALTER TABLE transaction_processing_state
+                ALTER COLUMN file_name SET DEFAULT '',
+                ALTER COLUMN file_name SET NOT NULL
+            """,
+            "ALTER TABLE transaction_processing_state DROP CONSTRAINT IF EXISTS transaction_processing_state_pkey",
+            "ALTER TABLE transaction_processing_state ADD PRIMARY KEY (card_name, file_name)",
+        ],
+    ),
+]
+
+
+def create_migrations_table(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at TIMESTAMP DEFAULT NOW()
+    );
+    """)
+
+
+def get_applied_versions(cur):
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def apply_migrations(conn):
+    """Apply every migration newer than the database's schema; returns the versions applied"""
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    applied = []
+    try:
+        with conn.cursor() as cur:
+            create_migrations_table(cur)
+            conn.commit()
+
+            # Serialize concurrent API pods starting up at the same time
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+            done = get_applied_versions(cur)
+            for version, name, statements in sorted(MIGRATIONS):
+                if version in done:
+                    continue
+                logger.info("Applying schema migration {}: {}", version, name)
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+                applied.append(version)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = autocommit
+    return applied
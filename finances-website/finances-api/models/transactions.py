@@ -2,10 +2,18 @@ from enum import Enum
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
+from functools import lru_cache
 import json
+import sys
+import numpy as np
+import pandas as pd
+from loguru import logger
 
 
 class TransactionData:
+    # No per-instance __dict__; a parsed statement can hold tens of thousands of these
+    __slots__ = ("id", "card_issuer", "date", "month", "day", "amount", "vendor", "category", "line_id", "year")
+
     def __init__(
         self,
         id: str,
@@ -30,33 +38,23 @@ class TransactionData:
         self.line_id = line_id
         self.year = year
 
+    def fingerprint(self):
+        """The fields __eq__ compares (everything but id and category), with the date as a datetime"""
+        date = self.date
+        if isinstance(date, str):
+            date = _parse_date(date)
+        return (self.card_issuer, date, self.month, self.day, self.amount, self.vendor, self.line_id, self.year)
+
     def __eq__(self, other):
         if not isinstance(other, TransactionData):
-            print("Not both instances")
             return False  # Ensure we only compare with other TransactionData objects
-        
-        # Fields to include in the comparison (excluding 'category')
-        fields_to_compare = {field for field in vars(self)}
-        fields_to_compare.remove("id")
-        fields_to_compare.remove("category")
-        
-        # Iterate through all fields to compare
-        for field in fields_to_compare:
-            self_value = getattr(self, field)
-            other_value = getattr(other, field)
-            
-            # Special handling for 'date' field
-            if field == "date":
-                if isinstance(self_value, str):
-                    self_value = datetime.fromisoformat(self_value.replace("T", " "))
-                if isinstance(other_value, str):
-                    other_value = datetime.fromisoformat(other_value.replace("T", " "))
-            
-            if self_value != other_value:
-                print(f"Field '{field}' is not equal: {self_value} != {other_value}")
-                return False
-        
-        return True
+        if self.fingerprint() == other.fingerprint():
+            return True
+        logger.trace("Transactions are not equal: {} != {}", self, other)
+        return False
+
+    def __hash__(self):
+        return hash(self.fingerprint())
 
     def __repr__(self):
         return (
@@ -65,7 +63,122 @@ class TransactionData:
             f"amount={self.amount}, vendor={self.vendor}, category={self.category}, "
             f"line_id={self.line_id})"
         )
-    
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(value: str):
+    # Decoded dates are strings; the same few hundred days come up over and over
+    return datetime.fromisoformat(value.replace("T", " "))
+
+
+class TransactionBatch:
+    """
+    Parsed transactions stored column by column, as parse_frame produces them and
+    bulk_load.copy_transactions consumes them.
+
+    ids are fixed-width ASCII, dates are days, and card issuers and vendors are
+    stored once per distinct string with an integer code per row, so a row costs
+    about 70 bytes instead of a TransactionData or a DataFrame row of Python
+    objects. Iterating or indexing yields TransactionData for code that wants rows.
+    """
+    __slots__ = ("ids", "issuer_codes", "card_issuers", "dates", "amounts", "vendor_codes", "vendors", "categories", "line_ids")
+
+    def __init__(self, ids, issuer_codes, card_issuers, dates, amounts, vendor_codes, vendors, line_ids, categories=None):
+        self.ids = np.asarray(ids, dtype="S36")
+        self.issuer_codes = np.asarray(issuer_codes, dtype=np.int16)
+        self.card_issuers = np.asarray(card_issuers, dtype=object)
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.amounts = np.asarray(amounts, dtype=np.float64)
+        self.vendor_codes = np.asarray(vendor_codes, dtype=np.int32)
+        self.vendors = np.asarray(vendors, dtype=object)
+        self.line_ids = np.asarray(line_ids, dtype=np.int64)
+        if categories is None:
+            categories = np.full(len(self.ids), "", dtype=object)
+        self.categories = np.asarray(categories, dtype=object)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [], [], [], [], [])
+
+    @classmethod
+    def concat(cls, batches):
+        """One batch with the rows of every batch in order, its strings deduplicated again"""
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+        issuer_codes, card_issuers = _merge_codes([(b.issuer_codes, b.card_issuers) for b in batches])
+        vendor_codes, vendors = _merge_codes([(b.vendor_codes, b.vendors) for b in batches])
+        return cls(
+            ids=np.concatenate([b.ids for b in batches]),
+            issuer_codes=issuer_codes,
+            card_issuers=card_issuers,
+            dates=np.concatenate([b.dates for b in batches]),
+            amounts=np.concatenate([b.amounts for b in batches]),
+            vendor_codes=vendor_codes,
+            vendors=vendors,
+            line_ids=np.concatenate([b.line_ids for b in batches]),
+            categories=np.concatenate([b.categories for b in batches]),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def years(self):
+        return self.dates.astype("datetime64[Y]").astype(np.int64) + 1970
+
+    @property
+    def months(self):
+        return self.dates.astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+    @property
+    def days(self):
+        return (self.dates - self.dates.astype("datetime64[M]")).astype(np.int64) + 1
+
+    @property
+    def nbytes(self):
+        """Memory held by the columns, counting each distinct string once"""
+        strings = {id(value): value for column in (self.card_issuers, self.vendors, self.categories) for value in column}
+        return (
+            sum(column.nbytes for column in (
+                self.ids, self.issuer_codes, self.card_issuers, self.dates, self.amounts,
+                self.vendor_codes, self.vendors, self.categories, self.line_ids
+            ))
+            + sum(sys.getsizeof(value) for value in strings.values())
+        )
+
+    def __getitem__(self, index):
+        day = self.dates[index].item()
+        return TransactionData(
+            id=self.ids[index].decode(),
+            card_issuer=self.card_issuers[self.issuer_codes[index]],
+            date=datetime(day.year, day.month, day.day),
+            month=day.month,
+            day=day.day,
+            amount=float(self.amounts[index]),
+            vendor=self.vendors[self.vendor_codes[index]],
+            category=self.categories[index],
+            line_id=int(self.line_ids[index]),
+            year=day.year
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return f"TransactionBatch({len(self)} transactions, {len(self.vendors)} vendors)"
+
+
+def _merge_codes(columns):
+    """Concatenate (codes, uniques) pairs into one codes array over one set of distinct values"""
+    offsets = np.cumsum([0] + [len(uniques) for _, uniques in columns])
+    merged, values = pd.factorize(np.concatenate([uniques for _, uniques in columns]))
+    codes = np.concatenate([codes + offset for (codes, _), offset in zip(columns, offsets)])
+    return merged[codes], values
+
 
 class TransactionEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException, Query
+from scripts import query_stats
+
+router = APIRouter()
+
+QUERY_SORTS = ("total_ms", "mean_ms", "max_ms", "calls", "rows", "slow", "errors")
+
+
+@router.get("/admin/queries")
+def get_queries(
+    sort: str = Query("total_ms", description=f"One of {', '.join(QUERY_SORTS)}"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """
+    Per-statement stats since startup (or the last reset): every statement is
+    grouped by its fingerprint, with calls, rows, timings and the routes that
+    issued it, plus the most recent statements slower than QUERY_SLOW_MS.
+    """
+    if sort not in QUERY_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(QUERY_SORTS)}")
+    return {
+        "settings": query_stats.get_settings(),
+        "queries": query_stats.get_query_stats(sort, limit),
+        "slow_queries": query_stats.get_slow_queries(),
+    }
+
+
+@router.post("/admin/queries/reset")
+def reset_queries():
+    """Start the query stats and slow-query log over"""
+    query_stats.reset_query_stats()
+    return {"status": "reset", "settings": query_stats.get_settings()}
@@ -1,20 +1,22 @@
 from fastapi import APIRouter, Depends
 from psycopg2.extras import RealDictCursor
+from scripts import reference_cache
 from scripts.db import get_db_connection
+from scripts.etags import conditional_get
 
 router = APIRouter()
 
-@router.get("/budget")
+def get_budget_items(cur):
+    """Budget as [{key, value}] with title-cased categories, read through the reference cache"""
+    return [
+        {'key': category.title(), 'value': amount}
+        for category, amount in reference_cache.get_budget(cur).items()
+    ]
+
+@router.get("/budget", dependencies=[Depends(conditional_get("budget"))])
 def get_budget(conn = Depends(get_db_connection)):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("SELECT category as key, amount as value FROM budget")
-        budget_items = cur.fetchall()
-        
-        for item in budget_items:
-            if 'key' in item:
-                item['key'] = item['key'].title()
-        
-        return budget_items
+        return get_budget_items(cur)
 
 @router.post("/budget/add")
 def add_budget(data: dict, conn = Depends(get_db_connection)):
@@ -29,15 +31,9 @@ def add_budget(data: dict, conn = Depends(get_db_connection)):
                 (key_to_add, new_value)
             )
             conn.commit()
+            reference_cache.invalidate("budget")
         
-        cur.execute("SELECT category as key, amount as value FROM budget")
-        budget_items = cur.fetchall()
-        
-        for item in budget_items:
-            if 'key' in item:
-                item['key'] = item['key'].title()
-        
-        return budget_items
+        return get_budget_items(cur)
 
 @router.patch("/budget/update")
 def update_budget(data: dict, conn = Depends(get_db_connection)):
@@ -50,15 +46,9 @@ def update_budget(data: dict, conn = Depends(get_db_connection)):
             (new_value, key_to_update)
         )
         conn.commit()
+        reference_cache.invalidate("budget")
         
-        cur.execute("SELECT category as key, amount as value FROM budget")
-        budget_items = cur.fetchall()
-        
-        for item in budget_items:
-            if 'key' in item:
-                item['key'] = item['key'].title()
-        
-        return budget_items
+        return get_budget_items(cur)
 
 @router.post("/budget/delete")
 def delete_budget(data: dict, conn = Depends(get_db_connection)):
@@ -70,12 +60,6 @@ def delete_budget(data: dict, conn = Depends(get_db_connection)):
             (key_to_delete,)
         )
         conn.commit()
+        reference_cache.invalidate("budget")
         
-        cur.execute("SELECT category as key, amount as value FROM budget")
-        budget_items = cur.fetchall()
-        
-        for item in budget_items:
-            if 'key' in item:
-                item['key'] = item['key'].title()
-        
-        return budget_items
+        return get_budget_items(cur)
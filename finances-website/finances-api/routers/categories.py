@@ -1,13 +1,70 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from scripts import categorizer
+from scripts import reference_cache
+from scripts.async_db import get_async_db_connection
 from scripts.db import get_db_connection
+from scripts.etags import conditional_get, conditional_get_async
 
 router = APIRouter()
 
-@router.get("/categories")
-async def get_categories(conn = Depends(get_db_connection)):
+@router.get("/categories", dependencies=[Depends(conditional_get_async("categories"))])
+async def get_categories(conn = Depends(get_async_db_connection)):
+    categories = {name: rank for name, rank in await reference_cache.get_categories_async(conn)}
+    return categories
+
+def get_category_rules(cur):
+    cur.execute("""
+        SELECT id, pattern, match_type, category, priority
+        FROM category_rules
+        ORDER BY match_type, priority DESC, pattern
+    """)
+    return cur.fetchall()
+
+@router.get("/categories/rules", dependencies=[Depends(conditional_get("category_rules"))])
+def get_rules(conn = Depends(get_db_connection)):
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        return get_category_rules(cur)
+
+@router.post("/categories/rules/add")
+def add_rule(data: dict, conn = Depends(get_db_connection)):
+    """Add a vendor rule, or replace the category of an existing one"""
+    pattern = data.get("pattern", "").strip()
+    match_type = data.get("match_type", "contains")
+    category = data.get("category", "").lower()
+    priority = int(data.get("priority", 0))
+    if not pattern or not category or match_type not in categorizer.MATCH_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A rule needs a pattern, a category and a match_type in {categorizer.MATCH_TYPES}"
+        )
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            INSERT INTO category_rules (pattern, match_type, category, priority)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (pattern, match_type) DO UPDATE SET
+                category = EXCLUDED.category,
+                priority = EXCLUDED.priority
+            RETURNING id
+        """, (pattern, match_type, category, priority))
+        rule_id = cur.fetchone()["id"]
+        conn.commit()
+        categorizer.get_categorizer(cur).set_rule(rule_id, pattern, match_type, category, priority)
+        return get_category_rules(cur)
+
+@router.post("/categories/rules/delete")
+def delete_rule(data: dict, conn = Depends(get_db_connection)):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("SELECT name, rank FROM categories")
-        categories = {row['name']: row['rank'] for row in cur.fetchall()}
-        return categories
+        rule_id = int(data.get("id", -1))
+        cur.execute("DELETE FROM category_rules WHERE id = %s", (rule_id,))
+        conn.commit()
+        categorizer.get_categorizer(cur).remove_rule(rule_id)
+        return get_category_rules(cur)
+
+@router.get("/categories/suggest")
+def suggest_category(vendor: str, conn = Depends(get_db_connection)):
+    """The category ingest would give a transaction from this vendor ('' if none)"""
+    with conn.cursor() as cur:
+        return {"vendor": vendor, "category": categorizer.get_categorizer(cur).categorize(vendor)}
@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from psycopg2.extras import RealDictCursor
+from typing import Optional
+from datetime import datetime
+from routers import budget, income, net_worth, rent, spending
+from scripts import reference_cache
+from scripts.db import get_db_connection
+from scripts.etags import conditional_get
+from scripts.log import logger
+
+router = APIRouter()
+
+# Every table a section can read, so the ETag changes whenever any section could
+DASHBOARD_TABLES = (
+    "monthly_category_totals", "categories", "budget", "income", "rent", "money_transfers", "net_worth"
+)
+
+# Sections built from the shared read of monthly_category_totals
+SPENDING_SECTIONS = ("thismonth", "lastmonth", "yeartodate", "categorized", "relativetoincome")
+DASHBOARD_SECTIONS = ("categories", "budget", "income", "rent", "networth") + SPENDING_SECTIONS
+
+
+def build_categorized_rows(totals):
+    """The rows /spending/yeartodate/categorized queries for, from get_monthly_totals rows"""
+    return [
+        {'year': row['year'], 'month': row['month'], 'category': row['category'], 'amount': row['total']}
+        for row in totals
+        if row['category'] not in ('payments', 'housing', '') and row['count'] > 0
+    ]
+
+
+def build_section(name, conn, cur, totals):
+    """One section, the same payload as the GET endpoint it replaces"""
+    if name == "categories":
+        return {category: rank for category, rank in reference_cache.get_categories(cur)}
+    if name == "budget":
+        return budget.get_budget_items(cur)
+    if name == "income":
+        return income.get_income(conn)
+    if name == "rent":
+        return rent.get_rent(conn)
+    if name == "networth":
+        return net_worth.get_net_worth(conn)
+    if name == "thismonth":
+        return spending.build_this_month(cur, totals)
+    if name == "lastmonth":
+        return spending.build_last_month(cur, totals)
+    if name == "yeartodate":
+        year = datetime.now().year
+        return spending.build_year_to_date(cur, spending.sum_months(totals, ('payments', 'work', ''), year))
+    if name == "categorized":
+        return spending.build_categorized(cur, build_categorized_rows(totals))
+    if name == "relativetoincome":
+        return spending.build_relative_to_income(cur, spending.sum_months(totals, ('payments', 'work', '')))
+
+
+@router.get("/dashboard", dependencies=[Depends(conditional_get(*DASHBOARD_TABLES))])
+def get_dashboard(
+    sections: Optional[str] = Query(None, description="Comma-separated sections; all of them when omitted"),
+    conn = Depends(get_db_connection)
+):
+    """
+    Several dashboard views in one request and one database session. Each section
+    matches its own endpoint (/spending/thismonth, /income, ...); the spending
+    sections share a single read of monthly_category_totals and the reference
+    cache. A section that fails is reported under "errors" without failing the rest.
+    """
+    requested = [s.strip() for s in sections.split(",") if s.strip()] if sections else list(DASHBOARD_SECTIONS)
+    unknown = [s for s in requested if s not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown dashboard sections: {', '.join(unknown)}. Choose from {', '.join(DASHBOARD_SECTIONS)}"
+        )
+
+    output = {}
+    errors = {}
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        totals = None
+        if any(s in SPENDING_SECTIONS for s in requested):
+            totals = spending.get_monthly_totals(cur)
+
+        for name in dict.fromkeys(requested):
+            # A failed query aborts the transaction, so roll back just this section
+            cur.execute("SAVEPOINT dashboard_section")
+            try:
+                output[name] = build_section(name, conn, cur, totals)
+                cur.execute("RELEASE SAVEPOINT dashboard_section")
+            except Exception as e:
+                logger.error("Error building dashboard section {}: {}", name, e)
+                cur.execute("ROLLBACK TO SAVEPOINT dashboard_section")
+                errors[name] = str(e)
+
+    if errors:
+        output["errors"] = errors
+    return output
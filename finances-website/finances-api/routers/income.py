@@ -1,28 +1,19 @@
 from fastapi import APIRouter, Depends
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from scripts import reference_cache
 from scripts.db import get_db_connection
+from scripts.etags import conditional_get
 
 router = APIRouter()
 
-@router.get("/income")
+@router.get("/income", dependencies=[Depends(conditional_get("income"))])
 def get_income(conn = Depends(get_db_connection)):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
-            SELECT year, month, amount 
-            FROM income 
-            ORDER BY year, array_position(
-                ARRAY['January', 'February', 'March', 'April', 'May', 'June', 'July', 
-                      'August', 'September', 'October', 'November', 'December'], 
-                month
-            )
-        """)
-        
         income_data = {}
-        for row in cur.fetchall():
-            year = str(row['year'])
-            month = row['month']
-            amount = float(row['amount'])
+        for row_year, month, row_amount in reference_cache.get_income(cur):
+            year = str(row_year)
+            amount = float(row_amount)
             
             if year not in income_data:
                 income_data[year] = {}
@@ -51,6 +42,7 @@ def add_income(data: dict, conn = Depends(get_db_connection)):
                        (year, month, amount))
         
         conn.commit()
+        reference_cache.invalidate("income")
         
         return get_income(conn)
 
@@ -69,5 +61,6 @@ def update_income(data: dict, conn = Depends(get_db_connection)):
         """, (year, month, amount, amount))
         
         conn.commit()
+        reference_cache.invalidate("income")
         
         return get_income(conn)
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from scripts.db import get_db_connection
+from scripts.etags import conditional_get
 import calendar
 from datetime import datetime, date, timedelta
 
@@ -71,7 +72,7 @@ def generate_defaults_for_period(start_date, end_date):
     
     return defaults_for_period
 
-@router.get("/moneyschedule")
+@router.get("/moneyschedule", dependencies=[Depends(conditional_get("money_schedule"))])
 def get_money_schedule(conn = Depends(get_db_connection)):
     today = date.today()
     end_date = today + timedelta(days=45)
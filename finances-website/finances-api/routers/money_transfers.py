@@ -4,11 +4,12 @@ from psycopg2.extras import RealDictCursor
 from datetime import datetime
 import uuid
 from scripts.db import get_db_connection
+from scripts.etags import conditional_get
 
 
 router = APIRouter()
 
-@router.get("/moneytransfers")
+@router.get("/moneytransfers", dependencies=[Depends(conditional_get("money_transfers"))])
 def get_money_transfers(conn = Depends(get_db_connection)):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
@@ -2,13 +2,15 @@ from fastapi import APIRouter, Depends
 import json
 from psycopg2.extras import RealDictCursor
 from scripts.db import get_db_connection
+from scripts.etags import conditional_get
+from scripts.log import logger
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
 
 router = APIRouter()
 
-@router.get("/networth")
+@router.get("/networth", dependencies=[Depends(conditional_get("net_worth"))])
 def get_net_worth(conn = Depends(get_db_connection)):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
@@ -88,7 +90,7 @@ def add_net_worth(data: dict, conn = Depends(get_db_connection)):
         return {"error": str(e)}
 
 
-@router.get("/networth/stockvesting")
+@router.get("/networth/stockvesting", dependencies=[Depends(conditional_get("stock_vesting_schedule"))])
 def get_net_worth_stock_vesting(conn = Depends(get_db_connection)):
     today = datetime.now().strftime("%Y-%m-%d")
     
@@ -138,9 +140,9 @@ def add_net_worth_stock_vesting(data: dict, conn = Depends(get_db_connection)):
         try:
             start = datetime.strptime(start_date, "%Y-%m-%d")
             end = datetime.strptime(end_date, "%Y-%m-%d")
-            print(f"Parsed dates: start={start}, end={end}")
+            logger.debug("Parsed dates: start={}, end={}", start, end)
         except ValueError as e:
-            print(f"Date parsing error: {str(e)}")
+            logger.warning("Date parsing error: {}", e)
             return {"error": f"Invalid date format. Expected YYYY-MM-DD. Error: {str(e)}"}
         
         frequency_map = {
@@ -151,7 +153,7 @@ def add_net_worth_stock_vesting(data: dict, conn = Depends(get_db_connection)):
         }
         
         if schedule not in frequency_map:
-            print(f"Invalid schedule: {schedule}")
+            logger.warning("Invalid schedule: {}", schedule)
             return {"error": f"Invalid schedule: {schedule}. Must be one of {list(frequency_map.keys())}"}
             
         frequency_months = frequency_map[schedule]
@@ -169,8 +171,8 @@ def add_net_worth_stock_vesting(data: dict, conn = Depends(get_db_connection)):
             rounded_percentage = round(cliff_percentage * 20) / 20  # Rounds to nearest 0.05 (5%)
             cliff_shares = int(total_shares * rounded_percentage)
             
-            print(f"Cliff percentage: {cliff_percentage:.2%}, rounded to {rounded_percentage:.2%}")
-            print(f"Cliff shares: {cliff_shares}")
+            logger.debug("Cliff percentage: {:.2%}, rounded to {:.2%}", cliff_percentage, rounded_percentage)
+            logger.debug("Cliff shares: {}", cliff_shares)
             
             remaining_shares = total_shares - cliff_shares
             
@@ -230,7 +232,7 @@ def add_net_worth_stock_vesting(data: dict, conn = Depends(get_db_connection)):
             table_exists = cur.fetchone()['exists']
             
             if not table_exists:
-                print("stock_vesting_schedule table does not exist!")
+                logger.error("stock_vesting_schedule table does not exist!")
                 return {"error": "The stock_vesting_schedule table does not exist in the database."}
             
             for date, shares in vesting_entries:
@@ -241,12 +243,10 @@ def add_net_worth_stock_vesting(data: dict, conn = Depends(get_db_connection)):
                 inserted_id = cur.fetchone()['id']
             
             conn.commit()
-            print("All entries inserted and committed successfully")
+            logger.info("All entries inserted and committed successfully")
             
             return get_net_worth_stock_vesting(conn)
             
     except Exception as e:
-        print(f"Error in add_net_worth_stock_vesting: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in add_net_worth_stock_vesting: {}", e)
         return {"error": str(e)}
\ No newline at end of file
@@ -1,21 +1,20 @@
 from fastapi import APIRouter, Depends
 import json
 from psycopg2.extras import RealDictCursor
+from scripts import reference_cache
 from scripts.db import get_db_connection
+from scripts.etags import conditional_get
 
 
 router = APIRouter()
 
-@router.get("/rent")
+@router.get("/rent", dependencies=[Depends(conditional_get("rent"))])
 def get_rent(conn = Depends(get_db_connection)):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("SELECT year, month, amount FROM rent ORDER BY year, month")
-        
         rent_data = {}
-        for row in cur.fetchall():
-            year_str = str(row['year'])
-            month = row['month']
-            amount = float(row['amount'])
+        for year, month, row_amount in reference_cache.get_rent(cur):
+            year_str = str(year)
+            amount = float(row_amount)
             
             if year_str not in rent_data:
                 rent_data[year_str] = {}
@@ -44,6 +43,7 @@ def add_rent(data: dict, conn = Depends(get_db_connection)):
                        (year, month, amount))
         
         conn.commit()
+        reference_cache.invalidate("rent")
         
         return get_rent(conn)
 
@@ -62,6 +62,7 @@ def update_rent(data: dict, conn = Depends(get_db_connection)):
         """, (year, month, amount, amount))
         
         conn.commit()
+        reference_cache.invalidate("rent")
         
         return get_rent(conn)
 
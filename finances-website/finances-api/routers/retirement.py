@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends
 from scripts.db import get_db_connection
+from scripts.log import logger
 from typing import List, Dict, Any
 from datetime import datetime
 
@@ -97,15 +98,11 @@ def retirement_coast(data: List[Dict[str, Any]]):
             year = current_year + current_year % 5
         new_row = {"row": row["row"]}
         while year <= 2060:
-            print(year)
             year_diff = 2060 - year
             future_diff = (year - current_year) * 12
-            print(future_diff)
-            print((1 + return_rate)**future_diff)
-            print(return_rate)
             pv = row["nest_egg"] / (1 + (return_rate*12))**year_diff
             pmt = (pv - current_value * (1 + return_rate)**future_diff) / (((1 + return_rate)**future_diff - 1)/(return_rate)) + 0.005
-            print(f"Value: {pv}, payment: {pmt}")
+            logger.trace("Coast fire in {}: value {}, payment {}", year, pv, pmt)
             new_header = { "title": f"Coast Fire in {year}", "key": year, "align": "center" }
             if new_header not in headers:
                 headers.append(
@@ -1,26 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import asyncpg
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from scripts import transaction_parser
+from psycopg2.extras import RealDictCursor, execute_values
+from scripts import ingest_worker
+from scripts import rollup
+from scripts import categorizer
 import uuid
 import string
-from datetime import datetime
-from scripts.db import get_db_connection
+import base64
+import csv
+import io
+import json
+from decimal import Decimal
+from datetime import datetime, date
+from typing import Optional
+from scripts.async_db import get_async_db_connection
+from scripts.db import get_db_connection, pooled_connection
+from scripts.etags import conditional_get
+from scripts.log import logger
 
 router = APIRouter()
 
 
-@router.get("/transactions/uncategorized")
-async def get_uncategorized_transactions(conn = Depends(get_db_connection)):
+@router.get("/transactions/uncategorized", dependencies=[Depends(conditional_get("transactions", "misformatted_transactions"))])
+def get_uncategorized_transactions(conn = Depends(get_db_connection)):
     try:
-        print("Starting transaction parsing")
-        await transaction_parser.parse_transactions()
-        print("Transaction parsing completed")
-        
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             try:
                 # Query for transactions with empty categories
-                print("Querying for uncategorized transactions")
+                logger.debug("Querying for uncategorized transactions")
                 cur.execute("""
                     SELECT id, card_issuer, date, month, day, year, amount, vendor, category, line_id
                     FROM transactions 
@@ -29,32 +38,28 @@ async def get_uncategorized_transactions(conn = Depends(get_db_connection)):
                 """)
                 
                 uncategorized = cur.fetchall()
-                print(f"Found {len(uncategorized)} uncategorized transactions")
+                logger.debug("Found {} uncategorized transactions", len(uncategorized))
                 
                 # Query for misformatted transactions
-                print("Querying for misformatted transactions")
+                logger.debug("Querying for misformatted transactions")
                 cur.execute("SELECT id, data FROM misformatted_transactions")
                 misformatted_rows = cur.fetchall()
                 misformatted = [row['data'] for row in misformatted_rows]
-                print(f"Found {len(misformatted)} misformatted transactions")
+                logger.debug("Found {} misformatted transactions", len(misformatted))
                 
                 return {
                     "transactions": uncategorized,
                     "misformatted_transactions": misformatted
                 }
             except Exception as e:
-                print(f"Database query error: {str(e)}")
-                import traceback
-                print(traceback.format_exc())
+                logger.exception("Database query error: {}", e)
                 return {
                     "transactions": [],
                     "misformatted_transactions": [],
                     "error": f"Database query error: {str(e)}"
                 }
     except Exception as e:
-        print(f"Transaction processing error: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Transaction processing error: {}", e)
         return {
             "transactions": [],
             "misformatted_transactions": [],
@@ -62,112 +67,485 @@ async def get_uncategorized_transactions(conn = Depends(get_db_connection)):
         }
 
 
-@router.get("/transactions")
-async def get_all_transactions(conn = Depends(get_db_connection)):
+@router.post("/transactions/ingest")
+async def trigger_transaction_ingest(wait: Optional[bool] = Query(None)):
+    """
+    Start an ingest job, or join the one already running. With wait=true the
+    response is the finished job; by default it only waits when the background
+    worker is disabled.
+    """
+    job, joined = ingest_worker.submit_ingest("manual")
+    if wait is None:
+        wait = not ingest_worker.INGEST_WORKER_ENABLED
+    if wait:
+        return {"status": "completed", "joined": joined, "job": await job.wait()}
+    return {"status": "joined" if joined else "queued", "job": job.to_dict()}
+
+
+@router.get("/transactions/ingest/status")
+async def get_transaction_ingest_status():
+    return ingest_worker.get_ingest_status()
+
+
+@router.get("/transactions/ingest/jobs")
+async def get_transaction_ingest_jobs():
+    return ingest_worker.get_ingest_jobs()
+
+
+@router.get("/transactions/ingest/jobs/{job_id}")
+async def get_transaction_ingest_job(job_id: str):
+    job = ingest_worker.get_ingest_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingest job {job_id} not found")
+    return job
+
+
+TRANSACTION_PAGE_SIZE = 100
+MAX_TRANSACTION_PAGE_SIZE = 1000
+
+
+def encode_cursor(row):
+    """Opaque keyset cursor for the (date, id) of the last row on a page"""
+    raw = f"{row['date'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_str, transaction_id = raw.split("|", 1)
+        return date.fromisoformat(date_str), transaction_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def build_transaction_filters(
+    card_issuer: Optional[str] = None,
+    category: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    vendor: Optional[str] = None,
+):
+    """
+    WHERE clauses and parameters for the transaction list filters.
+
+    An empty category matches uncategorized rows; vendor is a case-insensitive
+    substring match. Dates and amounts are inclusive.
+    """
+    clauses = []
+    params = []
+    if card_issuer:
+        clauses.append("card_issuer = %s")
+        params.append(card_issuer)
+    if category is not None:
+        if category == "":
+            clauses.append("(category = '' OR category IS NULL)")
+        else:
+            clauses.append("category = %s")
+            params.append(category)
+    if start_date is not None:
+        clauses.append("date >= %s")
+        params.append(start_date)
+    if end_date is not None:
+        clauses.append("date <= %s")
+        params.append(end_date)
+    if min_amount is not None:
+        clauses.append("amount >= %s")
+        params.append(min_amount)
+    if max_amount is not None:
+        clauses.append("amount <= %s")
+        params.append(max_amount)
+    if vendor:
+        escaped = vendor.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("vendor ILIKE %s")
+        params.append(f"%{escaped}%")
+    return clauses, params
+
+
+@router.get("/transactions", dependencies=[Depends(conditional_get("transactions"))])
+def get_all_transactions(
+    limit: int = Query(TRANSACTION_PAGE_SIZE, ge=1, le=MAX_TRANSACTION_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    card_issuer: Optional[str] = None,
+    category: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    vendor: Optional[str] = None,
+    include_total: bool = True,
+    conn = Depends(get_db_connection)
+):
+    """
+    Newest-first page of transactions.
+
+    Pass the returned next_cursor back as cursor to get the following page; it is
+    None on the last page. Pages are keyed on (date, id), so they stay stable while
+    new transactions are ingested. Set include_total=false to skip the COUNT(*).
+    """
+    clauses, params = build_transaction_filters(
+        card_issuer, category, start_date, end_date, min_amount, max_amount, vendor
+    )
+
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
+        total = None
+        if include_total:
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            cur.execute(f"SELECT COUNT(*) AS total FROM transactions {where}", params)
+            total = cur.fetchone()["total"]
+
+        page_clauses = list(clauses)
+        page_params = list(params)
+        if cursor:
+            page_clauses.append("(date, id) < (%s, %s)")
+            page_params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+
+        # Fetch one extra row to know whether there is another page
+        cur.execute(f"""
             SELECT id, card_issuer, date, month, day, year, amount, vendor, category, line_id
             FROM transactions
-            ORDER BY date DESC
-        """)
+            {where}
+            ORDER BY date DESC, id DESC
+            LIMIT %s
+        """, page_params + [limit + 1])
         
         transactions = cur.fetchall()
+        has_more = len(transactions) > limit
+        transactions = transactions[:limit]
         
         return {
-            "transactions": transactions
+            "transactions": transactions,
+            "next_cursor": encode_cursor(transactions[-1]) if has_more else None,
+            "total": total,
+            "limit": limit
         }
 
 
+EXPORT_COLUMNS = ["id", "card_issuer", "date", "month", "day", "year", "amount", "vendor", "category", "line_id"]
+# Rows pulled from the server-side cursor per round trip, and per streamed chunk
+EXPORT_CHUNK_ROWS = 2000
+
+
+def _export_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def stream_transactions(export_format: str, clauses: list, params: list):
+    """
+    Yield an export of the filtered transactions in chunks.
+
+    Rows come from a named (server-side) cursor, so only EXPORT_CHUNK_ROWS rows are
+    held in memory at a time. The connection is borrowed here rather than through
+    the request dependency because the body is sent after the handler returns.
+    """
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with pooled_connection() as conn:
+        try:
+            with conn.cursor(name="transactions_export") as cur:
+                cur.itersize = EXPORT_CHUNK_ROWS
+                cur.execute(f"""
+                    SELECT {', '.join(EXPORT_COLUMNS)}
+                    FROM transactions
+                    {where}
+                    ORDER BY date DESC, id DESC
+                """, params)
+
+                if export_format == "csv":
+                    buf = io.StringIO()
+                    writer = csv.writer(buf)
+                    writer.writerow(EXPORT_COLUMNS)
+                    yield buf.getvalue()
+
+                while True:
+                    rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+                    if not rows:
+                        break
+                    if export_format == "csv":
+                        buf = io.StringIO()
+                        writer = csv.writer(buf)
+                        writer.writerows(rows)
+                        yield buf.getvalue()
+                    else:
+                        yield "".join(
+                            json.dumps(dict(zip(EXPORT_COLUMNS, map(_export_value, row)))) + "\n"
+                            for row in rows
+                        )
+        except Exception as e:
+            # Headers are already sent, so all we can do is end the stream early
+            logger.error("Error exporting transactions: {}", e)
+        finally:
+            # Read-only, but the named cursor leaves a transaction open
+            conn.rollback()
+
+
+@router.get("/transactions/export")
+def export_transactions(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    card_issuer: Optional[str] = None,
+    category: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    vendor: Optional[str] = None,
+):
+    """Stream every transaction matching the list filters as NDJSON or CSV"""
+    clauses, params = build_transaction_filters(
+        card_issuer, category, start_date, end_date, min_amount, max_amount, vendor
+    )
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_transactions(export_format, clauses, params),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="transactions.{export_format}"'}
+    )
+
+
 @router.post("/transactions")
-async def update_transaction_category(transaction: dict, conn = Depends(get_db_connection)):
+async def update_transaction_category(transaction: dict, conn = Depends(get_async_db_connection)):
     try:
-        with conn.cursor() as cur:
-            # Update category in the transactions table
-            cur.execute("""
-                UPDATE transactions 
-                SET category = %s
-                WHERE id = %s
-            """, (
-                transaction["category"],
-                transaction["id"]
-            ))
+        async with conn.transaction():
+            # Update category in the transactions table, keeping the old one for the rollup
+            updated = await conn.fetchrow("""
+                UPDATE transactions t
+                SET category = $1
+                FROM (SELECT id, category FROM transactions WHERE id = $2 FOR UPDATE) old
+                WHERE t.id = old.id
+                RETURNING t.year, t.month, old.category, t.amount, t.vendor
+            """, transaction["category"], transaction["id"])
+            if updated:
+                year, month, old_category, amount, vendor = updated
+                await rollup.move_transaction_async(conn, year, month, old_category, transaction["category"], amount)
             
             # Check if any rows were updated
-            if cur.rowcount == 0:
+            if updated is None:
                 # If no rows updated, this is a new transaction - insert it
-                cur.execute("""
+                amount = Decimal(str(transaction["amount"]))
+                await conn.execute("""
                     INSERT INTO transactions 
                     (id, card_issuer, date, month, day, year, amount, vendor, category, line_id)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+                """,
                     transaction["id"],
                     transaction["card_issuer"],
-                    transaction["date"],
-                    transaction["month"],
-                    transaction["day"],
-                    transaction["year"],
-                    transaction["amount"],
+                    date.fromisoformat(str(transaction["date"])[:10]),
+                    int(transaction["month"]),
+                    int(transaction["day"]),
+                    int(transaction["year"]),
+                    amount,
                     transaction["vendor"],
                     transaction["category"],
-                    transaction["line_id"]
-                ))
-            
-            conn.commit()
-    
+                    int(transaction["line_id"])
+                )
+                await rollup.add_transaction_async(
+                    conn,
+                    transaction["year"],
+                    transaction["month"],
+                    transaction["category"],
+                    amount
+                )
+                old_category, vendor = None, transaction["vendor"]
+        
+        # The categorizer learns from the change once it is committed
+        categorizer.record_change(vendor, old_category, transaction["category"])
         return {"status": "success", "message": "Transaction category updated"}
-    except psycopg2.errors.UniqueViolation as e:
-        conn.rollback()
-        if "unique_transaction" in str(e):
+    except asyncpg.exceptions.UniqueViolationError as e:
+        if e.constraint_name == "unique_transaction":
             return {"status": "success", "message": "Transaction already exists (no changes needed)"}
         else:
             raise HTTPException(status_code=409, detail=f"Conflict error: {str(e)}")
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"Error updating transaction: {str(e)}")
 
 
 @router.post("/transactions/add")
-async def add_transaction(data: dict, conn = Depends(get_db_connection)):
+async def add_transaction(data: dict, conn = Depends(get_async_db_connection)):
     try:
-        with conn.cursor() as cur:
-            if "reference_data" in data and "index" in data:
-                cur.execute("SELECT data FROM misformatted_transactions WHERE id = %s", (data["index"],))
-                misformatted = cur.fetchone()[0]
+        if "reference_data" in data and "index" in data:
+            async with conn.transaction():
+                misformatted = await conn.fetchval(
+                    "SELECT data FROM misformatted_transactions WHERE id = $1 FOR UPDATE", int(data["index"])
+                )
+                matches = misformatted is not None and misformatted == data["reference_data"]
                 
-                if misformatted == data["reference_data"]:
-                    cur.execute("DELETE FROM misformatted_transactions WHERE id = %s", (data["index"],))
+                if matches:
+                    await conn.execute("DELETE FROM misformatted_transactions WHERE id = $1", int(data["index"]))
                     
                     day, month, year = data["date"].split("-")
-                    date_obj = datetime(int(year), int(month), int(day))
-                    
-                    transaction_id = str(uuid.uuid4())
+                    date_obj = date(int(year), int(month), int(day))
+                    amount = Decimal(str(float(data["amount"])))
+                    vendor = string.capwords(data["vendor"])
                     
-                    cur.execute("""
+                    await conn.execute("""
                         INSERT INTO transactions 
                         (id, card_issuer, date, month, day, year, amount, vendor, category, line_id)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        transaction_id,
+                        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+                    """,
+                        str(uuid.uuid4()),
                         "misformatted",
                         date_obj,
                         int(month),
                         int(day),
                         int(year),
-                        float(data["amount"]),
-                        string.capwords(data["vendor"]),
+                        amount,
+                        vendor,
                         data["category"],
                         -1
-                    ))
-                    
-                    conn.commit()
-                    
-                    cur.execute("SELECT id, data FROM misformatted_transactions")
-                    remaining = [row['data'] for row in cur.fetchall()]
-                    
-                    return remaining
-                    
-            raise HTTPException(status_code=417, detail="Reference data does not match misformatted transaction")
+                    )
+                    await rollup.add_transaction_async(conn, int(year), int(month), data["category"], amount)
+            
+            if matches:
+                categorizer.record_change(vendor, None, data["category"])
+                
+                rows = await conn.fetch("SELECT id, data FROM misformatted_transactions")
+                remaining = [row['data'] for row in rows]
+                
+                return remaining
+                
+        raise HTTPException(status_code=417, detail="Reference data does not match misformatted transaction")
                 
     except Exception as e:
-        print(f"Error adding transaction: {str(e)}")
+        logger.error("Error adding transaction: {}", e)
         raise HTTPException(status_code=417, detail=f"Failed to add transaction: {str(e)}")
+
+
+TRANSACTION_ROW_FIELDS = ["card_issuer", "date", "month", "day", "year", "amount", "vendor", "line_id"]
+
+
+@router.post("/transactions/bulk")
+def bulk_update_transaction_categories(data: dict, conn = Depends(get_db_connection)):
+    """
+    Categorize many transactions in one request and one database transaction.
+
+    data["transactions"] is a list of {id, category} items; an item that also has
+    every column of a transaction is inserted when its id isn't stored yet, like
+    POST /transactions. data["vendors"] is a list of {vendor, category} items that
+    set the category of every transaction from that vendor (only uncategorized ones
+    when only_uncategorized is true). Vendor items run first, so per-transaction
+    items win. Every item gets a status: updated, unchanged, inserted, duplicate,
+    not_found or invalid.
+    """
+    items = data.get("transactions") or []
+    vendor_items = data.get("vendors") or []
+
+    results = [{"id": item.get("id") if isinstance(item, dict) else None, "status": "invalid"} for item in items]
+    valid = {
+        index: str(item["id"]) for index, item in enumerate(items)
+        if isinstance(item, dict) and item.get("id") and isinstance(item.get("category"), str)
+    }
+    # The last item for an id wins
+    latest = {transaction_id: index for index, transaction_id in valid.items()}
+
+    vendor_results = []
+    deltas = []
+    learned = []
+    try:
+        with conn.cursor() as cur:
+            for item in vendor_items:
+                item = item if isinstance(item, dict) else {}
+                vendor, category = item.get("vendor"), item.get("category")
+                if not vendor or not isinstance(category, str):
+                    vendor_results.append({"vendor": vendor, "status": "invalid", "updated": 0})
+                    continue
+                only_uncategorized = "AND (category = '' OR category IS NULL)" if item.get("only_uncategorized") else ""
+                cur.execute(f"""
+                    UPDATE transactions t
+                    SET category = %s
+                    FROM (
+                        SELECT id, category FROM transactions
+                        WHERE vendor = %s {only_uncategorized}
+                        FOR UPDATE
+                    ) old
+                    WHERE t.id = old.id AND old.category IS DISTINCT FROM %s
+                    RETURNING t.year, t.month, old.category, t.amount
+                """, (category, vendor, category))
+                moved = cur.fetchall()
+                for year, month, old_category, amount in moved:
+                    deltas.extend([(year, month, old_category, -amount, -1), (year, month, category, amount, 1)])
+                    learned.append((vendor, old_category, category))
+                vendor_results.append({"vendor": vendor, "category": category, "status": "updated", "updated": len(moved)})
+
+            status = {}
+            if latest:
+                updated = execute_values(cur, """
+                    WITH v (id, category) AS (VALUES %s),
+                    old AS (
+                        SELECT o.id, o.category FROM transactions o JOIN v ON v.id = o.id
+                        FOR UPDATE OF o
+                    )
+                    UPDATE transactions t
+                    SET category = v.category
+                    FROM v, old
+                    WHERE t.id = v.id AND old.id = v.id
+                    RETURNING t.id, t.year, t.month, old.category, t.category, t.amount, t.vendor
+                """, [(transaction_id, items[index]["category"]) for transaction_id, index in latest.items()],
+                    page_size=len(latest), fetch=True)
+                for transaction_id, year, month, old_category, category, amount, vendor in updated:
+                    if (old_category or "") == category:
+                        status[transaction_id] = "unchanged"
+                        continue
+                    status[transaction_id] = "updated"
+                    deltas.extend([(year, month, old_category, -amount, -1), (year, month, category, amount, 1)])
+                    learned.append((vendor, old_category, category))
+
+                # Ids that aren't stored yet are inserted when the item carries the whole row
+                new_rows = [
+                    (
+                        transaction_id,
+                        items[index]["card_issuer"],
+                        items[index]["date"],
+                        items[index]["month"],
+                        items[index]["day"],
+                        items[index]["year"],
+                        items[index]["amount"],
+                        items[index]["vendor"],
+                        items[index]["category"],
+                        items[index]["line_id"]
+                    )
+                    for transaction_id, index in latest.items()
+                    if transaction_id not in status and all(field in items[index] for field in TRANSACTION_ROW_FIELDS)
+                ]
+                if new_rows:
+                    inserted = execute_values(cur, """
+                        INSERT INTO transactions
+                        (id, card_issuer, date, month, day, year, amount, vendor, category, line_id)
+                        VALUES %s
+                        ON CONFLICT DO NOTHING
+                        RETURNING id, year, month, category, amount, vendor
+                    """, new_rows, page_size=len(new_rows), fetch=True)
+                    for transaction_id, year, month, category, amount, vendor in inserted:
+                        status[transaction_id] = "inserted"
+                        deltas.append((year, month, category, amount, 1))
+                        learned.append((vendor, None, category))
+                    for row in new_rows:
+                        status.setdefault(row[0], "duplicate")
+
+            rollup.apply_deltas(cur, deltas)
+            conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Error updating transactions: {str(e)}")
+
+    for vendor, old_category, category in learned:
+        categorizer.record_change(vendor, old_category, category)
+
+    # Earlier items for the same id share the outcome of the last one
+    for index, transaction_id in valid.items():
+        results[index]["status"] = status.get(transaction_id, "not_found")
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return {
+        "status": "success",
+        "counts": counts,
+        "transactions": results,
+        "vendors": vendor_results
+    }
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import os
+import time
+import asyncpg
+from fastapi import HTTPException
+from dotenv import load_dotenv
+from scripts import query_stats
+from scripts.db import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DB_POOL_TIMEOUT
+from scripts.log import logger
+
+# Load environment variables
+load_dotenv()
+
+# Connection pool parameters for async routes; sync routes keep the psycopg2 pool
+ASYNC_DB_POOL_MIN_SIZE = int(os.getenv("ASYNC_DB_POOL_MIN_SIZE", "1"))
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX_SIZE", "5"))
+
+
+def observe_query(record):
+    """
+    asyncpg query logger feeding the query stats. asyncpg doesn't report row counts,
+    and slow statements are logged without a plan since the connection may be busy.
+    """
+    text, route = query_stats.record("async", record.query, record.elapsed, failed=record.exception is not None)
+    if record.elapsed * 1000 >= query_stats.QUERY_SLOW_MS:
+        query_stats.log_slow_query(text, route, record.query, record.elapsed)
+
+
+async def init_connection(conn):
+    """Decode JSON/JSONB columns to Python objects, like psycopg2 does, and time every statement"""
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(type_name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+    conn.add_query_logger(observe_query)
+
+
+async def connect():
+    """Open a new, unpooled asyncpg connection"""
+    conn = await asyncpg.connect(
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT
+    )
+    await init_connection(conn)
+    return conn
+
+
+class AsyncDatabasePool:
+    """asyncpg pool for async routes, with the same usage stats as DatabasePool"""
+
+    def __init__(self, min_size=ASYNC_DB_POOL_MIN_SIZE, max_size=ASYNC_DB_POOL_MAX_SIZE,
+                 timeout=DB_POOL_TIMEOUT):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self._pool = None
+        self._waiting = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def open(self):
+        self._pool = await asyncpg.create_pool(
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            init=init_connection
+        )
+        return self
+
+    async def acquire(self):
+        start = time.perf_counter()
+        self._waiting += 1
+        try:
+            conn = await self._pool.acquire(timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise TimeoutError(f"Timed out after {self.timeout}s waiting for a database connection")
+        finally:
+            self._waiting -= 1
+        waited = time.perf_counter() - start
+        self._acquired += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    async def release(self, conn):
+        # asyncpg resets the connection (rolling back any open transaction) on release
+        await self._pool.release(conn)
+
+    async def close(self):
+        await self._pool.close()
+
+    def stats(self):
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "in_use": size - idle,
+            "idle": idle,
+            "waiting": self._waiting,
+            "acquired": self._acquired,
+            "timeouts": self._timeouts,
+            "wait_time_total_ms": round(self._wait_total * 1000, 2),
+            "wait_time_avg_ms": round(self._wait_total * 1000 / self._acquired, 2) if self._acquired else 0,
+            "wait_time_max_ms": round(self._wait_max * 1000, 2),
+        }
+
+
+_pool = None
+
+
+async def init_async_pool():
+    """Create the app-wide asyncpg pool (called from the FastAPI startup hook)"""
+    global _pool
+    if _pool is None:
+        _pool = await AsyncDatabasePool().open()
+        logger.info("Async database pool initialized (min={}, max={})", ASYNC_DB_POOL_MIN_SIZE, ASYNC_DB_POOL_MAX_SIZE)
+    return _pool
+
+
+async def close_async_pool():
+    """Close every pooled asyncpg connection (called from the FastAPI shutdown hook)"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def get_async_pool_stats():
+    """Return usage stats for the asyncpg pool, or None if it isn't running"""
+    return _pool.stats() if _pool is not None else None
+
+
+async def get_async_db_connection():
+    """Dependency for async routes: an asyncpg connection that never blocks the event loop"""
+    try:
+        if _pool is not None:
+            db_pool = _pool
+            conn = await db_pool.acquire()
+        else:
+            db_pool = None
+            conn = await connect()
+        try:
+            yield conn
+        finally:
+            if db_pool is not None:
+                await db_pool.release(conn)
+            else:
+                await conn.close()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}")
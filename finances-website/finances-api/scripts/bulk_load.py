@@ -0,0 +1,149 @@
+import io
+import csv
+import json
+import numpy as np
+import pandas as pd
+from models.transactions import TransactionBatch
+
+TRANSACTION_COLUMNS = [
+    "id", "card_issuer", "date", "month", "day", "year", "amount", "vendor", "category", "line_id"
+]
+
+
+def _to_csv_buffer(rows, columns):
+    """Serialize a TransactionBatch, a DataFrame or an iterable of tuples into an in-memory CSV for COPY"""
+    if isinstance(rows, TransactionBatch):
+        return _batch_to_csv_buffer(rows)
+    buf = io.StringIO()
+    if isinstance(rows, pd.DataFrame):
+        rows[columns].to_csv(buf, header=False, index=False, date_format="%Y-%m-%d")
+    else:
+        csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    return buf
+
+
+def _quote(values):
+    """CSV-quote each string once, for the distinct values of a coded column"""
+    return np.array(['"' + str(value).replace('"', '""') + '"' for value in values], dtype=object)
+
+
+def _batch_to_csv_buffer(batch):
+    """
+    A TransactionBatch as CSV in TRANSACTION_COLUMNS order, built a column at a time.
+
+    Issuers, vendors, categories and days are formatted once per distinct value and
+    looked up by code, and the rows are joined straight from the column lists.
+    """
+    if not len(batch):
+        return io.StringIO()
+    category_codes, categories = pd.factorize(batch.categories)
+    date_codes, days = pd.factorize(batch.dates)
+    # date, month, day, year
+    day_fields = np.array([f"{day},{day.month},{day.day},{day.year}" for day in days.astype(object)], dtype=object)
+    columns = [
+        [value.decode() for value in batch.ids.tolist()],
+        _quote(batch.card_issuers)[batch.issuer_codes].tolist(),
+        day_fields[date_codes].tolist(),
+        list(map(repr, batch.amounts.tolist())),
+        _quote(batch.vendors)[batch.vendor_codes].tolist(),
+        # A missing category (code -1) picks the trailing empty field, which loads as ''
+        np.append(_quote(categories), "")[category_codes].tolist(),
+        list(map(str, batch.line_ids.tolist())),
+    ]
+    return io.StringIO("\n".join(map(",".join, zip(*columns))) + "\n")
+
+
+def copy_transactions(cur, rows):
+    """
+    Bulk load transactions through a temporary staging table.
+
+    rows is a TransactionBatch, a DataFrame with TRANSACTION_COLUMNS or an iterable of
+    tuples in that order.
+    Everything is COPY'd into the staging table and moved into transactions with one
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING, so rows that clash with the id primary
+    key or the unique_transaction constraint are skipped without per-row round trips.
+    Inserted rows are added to monthly_category_totals by the same statement.
+    Returns (inserted, skipped). The caller owns the transaction and must commit.
+    """
+    columns = ", ".join(TRANSACTION_COLUMNS)
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS transactions_staging
+        (LIKE transactions INCLUDING DEFAULTS)
+        ON COMMIT DELETE ROWS
+    """)
+    cur.execute("TRUNCATE transactions_staging")
+
+    cur.copy_expert(
+        f"COPY transactions_staging ({columns}) FROM STDIN "
+        "WITH (FORMAT csv, FORCE_NOT_NULL (vendor, category))",
+        _to_csv_buffer(rows, TRANSACTION_COLUMNS)
+    )
+    cur.execute("SELECT COUNT(*) FROM transactions_staging")
+    staged = cur.fetchone()[0]
+
+    # Rows that actually went in are added to the monthly rollup in the same statement
+    cur.execute(f"""
+        WITH inserted AS (
+            INSERT INTO transactions ({columns})
+            SELECT {columns} FROM transactions_staging
+            ON CONFLICT DO NOTHING
+            RETURNING year, month, category, amount
+        ), rolled_up AS (
+            INSERT INTO monthly_category_totals AS m (year, month, category, total, count)
+            SELECT year, month, COALESCE(category, ''), SUM(amount), COUNT(*)
+            FROM inserted
+            WHERE year IS NOT NULL AND month IS NOT NULL
+            GROUP BY year, month, COALESCE(category, '')
+            ON CONFLICT (year, month, category) DO UPDATE SET
+                total = m.total + EXCLUDED.total,
+                count = m.count + EXCLUDED.count
+        )
+        SELECT COUNT(*) FROM inserted
+    """)
+    inserted = cur.fetchone()[0]
+    return inserted, staged - inserted
+
+
+def copy_misformatted_transactions(cur, rows):
+    """
+    Bulk load misformatted rows through a temporary staging table.
+
+    New rows are numbered after the highest stored id, and rows whose data is already
+    stored (or repeated within the batch) are skipped. Returns (inserted, skipped).
+    The caller owns the transaction and must commit.
+    """
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS misformatted_staging (
+            ord INTEGER,
+            data JSONB
+        )
+        ON COMMIT DELETE ROWS
+    """)
+    cur.execute("TRUNCATE misformatted_staging")
+
+    cur.copy_expert(
+        "COPY misformatted_staging (ord, data) FROM STDIN WITH (FORMAT csv)",
+        _to_csv_buffer(((i, json.dumps(row)) for i, row in enumerate(rows)), ["ord", "data"])
+    )
+    cur.execute("SELECT COUNT(*) FROM misformatted_staging")
+    staged = cur.fetchone()[0]
+
+    cur.execute("""
+        INSERT INTO misformatted_transactions (id, data)
+        SELECT
+            (SELECT COALESCE(MAX(id) + 1, 0) FROM misformatted_transactions)
+                + ROW_NUMBER() OVER (ORDER BY s.ord) - 1,
+            s.data
+        FROM (
+            SELECT DISTINCT ON (data) ord, data
+            FROM misformatted_staging
+            ORDER BY data, ord
+        ) s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM misformatted_transactions m WHERE m.data = s.data
+        )
+        ON CONFLICT DO NOTHING
+    """)
+    inserted = cur.rowcount
+    return inserted, staged - inserted
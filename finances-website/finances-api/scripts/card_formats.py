@@ -0,0 +1,333 @@
+import io
+import re
+import csv
+import pandas as pd
+
+
+class CardFormat:
+    """
+    Describes the layout of one card issuer's statement export.
+
+    header lists the columns a file's first line must contain to match. When several
+    formats share a header (e.g. AMEX and Bilt), filename_hints decide between them.
+    card_names maps filename keywords to the card_name stored on each transaction.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        header: list,
+        date_key: str,
+        date_format: str,
+        debit_key: str,
+        vendor_key: str,
+        credit_key: str = "",
+        sep: str = ",",
+        collapse_separators: bool = False,
+        strip_whitespace: bool = False,
+        quoting: int = csv.QUOTE_MINIMAL,
+        filename_hints: list = None,
+        card_names: list = None,
+        default_card_name: str = None,
+    ):
+        self.name = name
+        self.header = header
+        self.date_key = date_key
+        self.date_format = date_format
+        self.debit_key = debit_key
+        self.vendor_key = vendor_key
+        self.credit_key = credit_key
+        self.sep = sep
+        # Runs of the separator count as one, and leading/trailing ones are ignored
+        self.collapse_separators = collapse_separators
+        self.strip_whitespace = strip_whitespace
+        self.quoting = quoting
+        self.filename_hints = filename_hints or []
+        self.card_names = card_names or []
+        self.default_card_name = default_card_name or name
+
+    @property
+    def legacy_sep(self):
+        """Separator understood by read_csv_file's manual fallback path"""
+        return self.sep * 2 if self.collapse_separators else self.sep
+
+    def split_header(self, header_line: str):
+        header_line = header_line.lstrip("﻿").rstrip("\r\n")
+        if self.collapse_separators:
+            cells = [cell for cell in header_line.split(self.sep) if cell.strip()]
+        else:
+            cells = next(csv.reader([header_line], delimiter=self.sep), [])
+        return [cell.strip().strip('"') for cell in cells]
+
+    def matches_header(self, header_line: str):
+        columns = set(self.split_header(header_line))
+        return all(column in columns for column in self.header)
+
+    def matches_filename(self, filename: str):
+        filename = filename.lower()
+        return any(hint in filename for hint in self.filename_hints)
+
+    def card_name_for(self, filename: str):
+        filename = filename.lower()
+        for keyword, card_name in self.card_names:
+            if keyword in filename:
+                return card_name
+        return self.default_card_name
+
+    @property
+    def dtypes(self):
+        """Read every column as text; parse_frame does the typed conversion"""
+        return str
+
+    def __repr__(self):
+        return f"CardFormat(name={self.name}, header={self.header}, sep={self.sep!r})"
+
+
+CARD_FORMATS = []
+# file hash -> format name, so a file's header is only matched once
+_detected_formats = {}
+MAX_CACHED_FORMATS = 512
+
+
+def register_card_format(card_format: CardFormat):
+    """Add a statement layout; formats registered earlier win ties"""
+    CARD_FORMATS.append(card_format)
+    return card_format
+
+
+def get_card_format(name: str):
+    for card_format in CARD_FORMATS:
+        if card_format.name == name:
+            return card_format
+    return None
+
+
+def read_header_line(file_path: str):
+    with open(file_path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        return f.readline()
+
+
+def detect_format(file_path: str, file_hash: str = None, cache: dict = None):
+    """
+    Find the registered format whose header signature matches the file.
+
+    Results are cached by content hash in `cache` (the module cache by default).
+    """
+    cache = _detected_formats if cache is None else cache
+    if file_hash and file_hash in cache:
+        return get_card_format(cache[file_hash])
+
+    header_line = read_header_line(file_path)
+    filename = file_path.split("/")[-1]
+    candidates = [f for f in CARD_FORMATS if f.matches_header(header_line)]
+    named = [f for f in candidates if f.matches_filename(filename)]
+
+    if named:
+        card_format = named[0]
+    elif len(candidates) == 1:
+        card_format = candidates[0]
+    else:
+        card_format = None
+
+    if card_format is not None and file_hash:
+        if len(cache) >= MAX_CACHED_FORMATS:
+            cache.clear()
+        cache[file_hash] = card_format.name
+    return card_format
+
+
+def get_format_cache():
+    return _detected_formats
+
+
+def collapse_separators(text: str, sep: str):
+    """Squeeze runs of sep into one and drop leading/trailing sep on each line"""
+    pattern = re.escape(sep)
+    text = re.sub(f"(?:{pattern}){{2,}}", lambda _: sep, text)
+    return re.sub(f"(?m)^{pattern}|{pattern}(?=\\r?$)", "", text)
+
+
+class StatementStream:
+    """
+    File-like wrapper used for chunked reads.
+
+    Tracks how many bytes of the file have been consumed and, for layouts with
+    collapse_separators, rewrites the file one line at a time instead of in memory.
+    """
+
+    def __init__(self, file_path: str, card_format: CardFormat):
+        self._raw = open(file_path, 'rb')
+        self._text = io.TextIOWrapper(self._raw, encoding='utf-8-sig', newline='')
+        self._collapse = card_format.collapse_separators
+        self._sep = card_format.sep
+        self._pending = ""
+
+    @property
+    def bytes_read(self):
+        return self._raw.tell()
+
+    def read(self, size: int = -1):
+        if not self._collapse:
+            return self._text.read(size)
+        while size is None or size < 0 or len(self._pending) < size:
+            line = self._text.readline()
+            if not line:
+                break
+            self._pending += collapse_separators(line, self._sep)
+        if size is None or size < 0:
+            data, self._pending = self._pending, ""
+        else:
+            data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def readline(self):
+        if self._pending:
+            line, newline, rest = self._pending.partition("\n")
+            if newline:
+                self._pending = rest
+                return line + newline
+            self._pending = ""
+            return line + self.readline()
+        line = self._text.readline()
+        return collapse_separators(line, self._sep) if self._collapse else line
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        self._text.close()
+
+
+def iter_statement(file_path: str, card_format: CardFormat, chunk_rows: int,
+                   engine: str = 'c', on_bad_lines='error'):
+    """
+    Yield (chunk, bytes_read) pairs of at most chunk_rows rows.
+
+    The row index runs on across chunks, so it matches what read_statement returns
+    for the whole file. Only one chunk is held in memory at a time.
+    """
+    stream = StatementStream(file_path, card_format)
+    try:
+        options = {"quoting": card_format.quoting} if engine == 'c' else {}
+        with pd.read_csv(
+            stream,
+            sep=card_format.sep,
+            engine=engine,
+            dtype=card_format.dtypes,
+            chunksize=chunk_rows,
+            on_bad_lines=on_bad_lines,
+            skip_blank_lines=True,
+            **options,
+        ) as reader:
+            for chunk in reader:
+                if card_format.strip_whitespace:
+                    chunk = strip_frame(chunk)
+                yield chunk, stream.bytes_read
+    finally:
+        stream.close()
+
+
+def read_statement(file_path: str, card_format: CardFormat):
+    """
+    Read a statement with a single C-engine read_csv call.
+
+    Raises pandas.errors.ParserError if a row doesn't fit the header, so the caller
+    can fall back to the line-by-line reader that collects irregular rows.
+    """
+    source = file_path
+    if card_format.collapse_separators:
+        with open(file_path, 'r', encoding='utf-8-sig') as f:
+            source = io.StringIO(collapse_separators(f.read(), card_format.sep))
+
+    df = pd.read_csv(
+        source,
+        sep=card_format.sep,
+        engine='c',
+        dtype=card_format.dtypes,
+        quoting=card_format.quoting,
+        encoding='utf-8-sig',
+        skip_blank_lines=True,
+    )
+    return strip_frame(df) if card_format.strip_whitespace else df
+
+
+def strip_frame(df: pd.DataFrame):
+    """Strip padding from column names and text cells"""
+    if df.empty:
+        return df
+    df.columns = [str(col).strip() for col in df.columns]
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            df[col] = df[col].str.strip()
+    return df
+
+
+register_card_format(CardFormat(
+    name="discover",
+    header=["Trans. Date", "Description", "Amount"],
+    date_key="Trans. Date",
+    date_format="%m/%d/%Y",
+    debit_key="Amount",
+    vendor_key="Description",
+    filename_hints=["discover"],
+    default_card_name="Discover",
+))
+
+register_card_format(CardFormat(
+    name="amex",
+    header=["Date", "Description", "Amount"],
+    date_key="Date",
+    date_format="%m/%d/%Y",
+    debit_key="Amount",
+    vendor_key="Description",
+    filename_hints=["amex"],
+    card_names=[("blue", "amex_blue")],
+    default_card_name="amex_delta",
+))
+
+register_card_format(CardFormat(
+    name="capone",
+    header=["Transaction Date", "Description", "Debit", "Credit"],
+    date_key="Transaction Date",
+    date_format="%Y-%m-%d",
+    debit_key="Debit",
+    vendor_key="Description",
+    credit_key="Credit",
+    filename_hints=["capone", "capital"],
+    card_names=[("x", "capone_venture_x")],
+    default_card_name="capone_venture",
+))
+
+register_card_format(CardFormat(
+    name="citi",
+    header=["Status", "Date", "Description", "Amount"],
+    date_key="Date",
+    date_format="%m/%d/%Y",
+    debit_key="Amount",
+    vendor_key="Description",
+    sep="\t",
+    collapse_separators=True,
+    strip_whitespace=True,
+    quoting=csv.QUOTE_NONE,
+    filename_hints=["citi"],
+    card_names=[("custom", "citi_custom")],
+    default_card_name="citi_double",
+))
+
+register_card_format(CardFormat(
+    name="wells_fargo_bilt",
+    header=["Date", "Description", "Amount"],
+    date_key="Date",
+    date_format=None,
+    debit_key="Amount",
+    vendor_key="Description",
+    filename_hints=["wellsfargo", "bilt"],
+    card_names=[("wellsfargo", "wells_fargo")],
+    default_card_name="bilt",
+))
@@ -0,0 +1,340 @@
+import os
+import re
+import threading
+from collections import Counter, deque
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from scripts.log import logger
+
+# Load environment variables
+load_dotenv()
+
+# Categorize new transactions during ingest
+AUTO_CATEGORIZE = os.getenv("AUTO_CATEGORIZE", "true").lower() in ("1", "true", "yes")
+# Share of a vendor's history one category needs before it is applied automatically
+LEARNED_MIN_SHARE = float(os.getenv("CATEGORIZER_MIN_SHARE", "0.6"))
+# Transactions with a vendor prefix before the prefix is trusted on its own
+PREFIX_MIN_COUNT = int(os.getenv("CATEGORIZER_PREFIX_MIN_COUNT", "2"))
+# Leading words of a normalized vendor that make up its prefix key
+PREFIX_WORDS = 2
+
+MATCH_TYPES = ("exact", "prefix", "contains")
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def vendor_key(vendor):
+    """Key for exact vendor lookups"""
+    return " ".join(str(vendor).lower().split())
+
+
+def normalize_vendor(vendor):
+    """
+    Lowercase a vendor and drop punctuation and any word containing digits, so
+    'Amazon Mktpl*2o2w51u73' and 'Amazon Mktpl*as2ah1yh3' both become 'amazon mktpl'.
+    """
+    words = _NON_ALNUM.sub(" ", str(vendor).lower()).split()
+    return " ".join(word for word in words if not any(ch.isdigit() for ch in word))
+
+
+def prefix_key(vendor):
+    return " ".join(normalize_vendor(vendor).split()[:PREFIX_WORDS])
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: one pass over the text finds every pattern"""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for index, pattern in enumerate(self.patterns):
+            self._add(pattern, index)
+        self._link()
+
+    def _add(self, pattern, index):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(index)
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def search(self, text):
+        """Indexes of every pattern that occurs in text"""
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            if self._out[node]:
+                found.update(self._out[node])
+        return found
+
+
+class Categorizer:
+    """
+    Suggests a category for a vendor string.
+
+    Explicit rules win over learned history, in this order: exact rules, prefix
+    rules, contains rules (longest match, then priority), the vendor's own history,
+    then the history of vendors sharing its prefix. Learned suggestions are only
+    made when one category holds LEARNED_MIN_SHARE of the history.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.rules = {}
+        self._exact_rules = {}
+        self._prefix_rules = {}
+        self._prefix_lengths = []
+        self._contains_rules = []
+        self._matcher = None
+        self._matcher_dirty = False
+        self._vendor_counts = {}
+        self._prefix_counts = {}
+        self._vendor_best = {}
+        self._prefix_best = {}
+
+    # -- loading ---------------------------------------------------------------
+
+    def load(self, cur):
+        """Build every structure from category_rules and the categorized history"""
+        # A plain cursor on the same connection, whatever cursor_factory cur uses
+        with self._lock, cur.connection.cursor() as cur:
+            cur.execute("""
+                SELECT id, pattern, match_type, category, priority
+                FROM category_rules
+            """)
+            self.rules = {}
+            for rule_id, pattern, match_type, category, priority in cur.fetchall():
+                self.rules[rule_id] = (pattern, match_type, category, priority or 0)
+            self._index_rules()
+
+            cur.execute("""
+                SELECT vendor, category, COUNT(*)
+                FROM transactions
+                WHERE category != '' AND category IS NOT NULL AND vendor IS NOT NULL
+                GROUP BY vendor, category
+            """)
+            self._vendor_counts = {}
+            self._prefix_counts = {}
+            for vendor, category, count in cur.fetchall():
+                self._count(vendor, category, count)
+            self._vendor_best = {key: self._best(counts, 1) for key, counts in self._vendor_counts.items()}
+            self._prefix_best = {key: self._best(counts, PREFIX_MIN_COUNT) for key, counts in self._prefix_counts.items()}
+        return self
+
+    def _index_rules(self):
+        self._exact_rules = {}
+        self._prefix_rules = {}
+        self._contains_rules = []
+        for pattern, match_type, category, priority in self.rules.values():
+            if match_type == "exact":
+                self._set_rule(self._exact_rules, vendor_key(pattern), category, priority)
+            elif match_type == "prefix":
+                self._set_rule(self._prefix_rules, normalize_vendor(pattern), category, priority)
+            else:
+                self._contains_rules.append((normalize_vendor(pattern), category, priority))
+        self._prefix_lengths = sorted({len(p) for p in self._prefix_rules}, reverse=True)
+        self._matcher_dirty = True
+
+    @staticmethod
+    def _set_rule(rules, key, category, priority):
+        if key and (key not in rules or priority >= rules[key][1]):
+            rules[key] = (category, priority)
+
+    # -- learned history -----------------------------------------------------------
+
+    def _count(self, vendor, category, count):
+        for key, table in ((vendor_key(vendor), self._vendor_counts), (prefix_key(vendor), self._prefix_counts)):
+            if not key:
+                continue
+            counts = table.setdefault(key, Counter())
+            counts[category] += count
+            if counts[category] <= 0:
+                del counts[category]
+
+    @staticmethod
+    def _best(counts, min_count):
+        total = sum(counts.values())
+        if total < min_count:
+            return None
+        category, count = counts.most_common(1)[0]
+        return category if count / total >= LEARNED_MIN_SHARE else None
+
+    def record_change(self, vendor, old_category, new_category):
+        """
+        Update the learned history after a transaction is (re)categorized.
+
+        Only the vendor's own entry and its prefix entry are recomputed.
+        """
+        if not vendor:
+            return
+        with self._lock:
+            if old_category:
+                self._count(vendor, old_category, -1)
+            if new_category:
+                self._count(vendor, new_category, 1)
+            key = vendor_key(vendor)
+            counts = self._vendor_counts.get(key)
+            self._vendor_best[key] = self._best(counts, 1) if counts else None
+            key = prefix_key(vendor)
+            counts = self._prefix_counts.get(key)
+            self._prefix_best[key] = self._best(counts, PREFIX_MIN_COUNT) if counts else None
+
+    # -- rules -------------------------------------------------------------------
+
+    def set_rule(self, rule_id, pattern, match_type, category, priority=0):
+        with self._lock:
+            self.rules[rule_id] = (pattern, match_type, category, priority or 0)
+            self._reindex_rule_type(match_type)
+
+    def remove_rule(self, rule_id):
+        with self._lock:
+            rule = self.rules.pop(rule_id, None)
+            if rule is not None:
+                self._reindex_rule_type(rule[1])
+
+    def _reindex_rule_type(self, match_type):
+        """Only the structure for the changed rule's match type is rebuilt"""
+        rules = [rule for rule in self.rules.values() if rule[1] == match_type]
+        if match_type == "exact":
+            self._exact_rules = {}
+            for pattern, _, category, priority in rules:
+                self._set_rule(self._exact_rules, vendor_key(pattern), category, priority)
+        elif match_type == "prefix":
+            self._prefix_rules = {}
+            for pattern, _, category, priority in rules:
+                self._set_rule(self._prefix_rules, normalize_vendor(pattern), category, priority)
+            self._prefix_lengths = sorted({len(p) for p in self._prefix_rules}, reverse=True)
+        else:
+            self._contains_rules = [(normalize_vendor(p), c, pr) for p, _, c, pr in rules]
+            self._matcher_dirty = True
+
+    def _get_matcher(self):
+        # The automaton is rebuilt lazily, once per batch of contains rule changes
+        if self._matcher_dirty:
+            patterns = [pattern for pattern, _, _ in self._contains_rules if pattern]
+            self._contains_rules = [rule for rule in self._contains_rules if rule[0]]
+            self._matcher = AhoCorasick(patterns) if patterns else None
+            self._matcher_dirty = False
+        return self._matcher
+
+    # -- matching ----------------------------------------------------------------
+
+    def categorize(self, vendor):
+        """Category for one vendor, or '' if nothing matches confidently"""
+        if not vendor:
+            return ""
+        with self._lock:
+            key = vendor_key(vendor)
+            if key in self._exact_rules:
+                return self._exact_rules[key][0]
+
+            normalized = normalize_vendor(vendor)
+            for length in self._prefix_lengths:
+                rule = self._prefix_rules.get(normalized[:length])
+                if rule is not None and (len(normalized) == length or normalized[length] == " "):
+                    return rule[0]
+
+            matcher = self._get_matcher()
+            if matcher is not None:
+                found = matcher.search(normalized)
+                if found:
+                    best = max(found, key=lambda i: (len(self._contains_rules[i][0]), self._contains_rules[i][2]))
+                    return self._contains_rules[best][1]
+
+            return self._vendor_best.get(key) or self._prefix_best.get(prefix_key(vendor)) or ""
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rules": len(self.rules),
+                "learned_vendors": sum(1 for v in self._vendor_best.values() if v),
+                "learned_prefixes": sum(1 for v in self._prefix_best.values() if v),
+            }
+
+
+_categorizer = None
+_categorizer_lock = threading.Lock()
+
+
+def get_categorizer(cur):
+    """The process-wide categorizer, loaded from the database on first use"""
+    global _categorizer
+    with _categorizer_lock:
+        if _categorizer is None:
+            _categorizer = Categorizer().load(cur)
+            logger.info("Categorizer loaded: {}", _categorizer.stats())
+        return _categorizer
+
+
+def record_change(vendor, old_category, new_category):
+    """Feed a committed (re)categorization to the loaded categorizer, if there is one"""
+    if _categorizer is not None and (old_category or "") != (new_category or ""):
+        _categorizer.record_change(vendor, old_category, new_category)
+
+
+def reset_categorizer():
+    """Drop the loaded categorizer so the next use reloads it from the database"""
+    global _categorizer
+    with _categorizer_lock:
+        _categorizer = None
+
+
+def categorize_batch(cur, batch):
+    """
+    Fill blank categories of a parse_frame TransactionBatch in place; returns the
+    (vendor, category) pair of every row it set, for record_categorized.
+    """
+    if not AUTO_CATEGORIZE or batch is None or not len(batch):
+        return []
+    blank = pd.isna(batch.categories) | (batch.categories == "")
+    if not blank.any():
+        return []
+    # The batch keeps each distinct vendor once, so each is matched once
+    categorizer = get_categorizer(cur)
+    by_vendor = np.full(len(batch.vendors), "", dtype=object)
+    for code in np.unique(batch.vendor_codes[blank]):
+        by_vendor[code] = categorizer.categorize(batch.vendors[code])
+    codes = batch.vendor_codes[blank]
+    categories = by_vendor[codes]
+    batch.categories[blank] = categories
+    set_codes = codes[categories != ""]
+    return list(zip(batch.vendors[set_codes], by_vendor[set_codes]))
+
+
+def record_categorized(categorized, stored_all):
+    """
+    Feed the categories categorize_batch set to the learned history, once their rows
+    are committed. If some rows were skipped as already stored there's no telling
+    which, so the categorizer is reloaded from the database instead.
+    """
+    if not categorized:
+        return
+    if not stored_all:
+        reset_categorizer()
+        return
+    for vendor, category in categorized:
+        record_change(vendor, "", category)
@@ -1,7 +1,13 @@
 import os
+import threading
+import time
 import psycopg2
+from contextlib import contextmanager
+from psycopg2 import pool, extensions
 from fastapi import HTTPException
 from dotenv import load_dotenv
+from scripts.query_stats import InstrumentedConnection
+from scripts.log import logger
 
 # Load environment variables
 load_dotenv()
@@ -13,20 +19,236 @@ DB_NAME = os.getenv("POSTGRES_DB", "finances")
 DB_USER = os.getenv("POSTGRES_USER", "finances")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "")
 
-def get_db_connection():
-    """Dependency function to get database connection"""
-    try:
-        conn = psycopg2.connect(
+# Connection pool parameters
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+# Only connections that sat in the pool at least this long (seconds) are pinged
+DB_POOL_PRE_PING_IDLE = float(os.getenv("DB_POOL_PRE_PING_IDLE", "30"))
+
+
+def connect():
+    """Open a new, unpooled database connection"""
+    return psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT,
+        connection_factory=InstrumentedConnection
+    )
+
+
+class DatabasePool:
+    """Thread-safe connection pool that blocks when exhausted and tracks usage stats"""
+
+    def __init__(self, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 timeout=DB_POOL_TIMEOUT, pre_ping=DB_POOL_PRE_PING, pre_ping_idle=DB_POOL_PRE_PING_IDLE):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.pre_ping_idle = pre_ping_idle
+        self._pool = pool.ThreadedConnectionPool(
+            min_size,
+            max_size,
             dbname=DB_NAME,
             user=DB_USER,
             password=DB_PASSWORD,
             host=DB_HOST,
-            port=DB_PORT
+            port=DB_PORT,
+            connection_factory=InstrumentedConnection
         )
+        # psycopg2 raises instead of waiting when the pool is empty, so gate it
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        # Held around every call into self._pool (which serializes them anyway), so
+        # _idle always matches the connections it holds
+        self._pool_lock = threading.Lock()
+        self._idle = min_size
+        # id(conn) -> when it was last returned, for the connections the pool holds
+        self._returned_at = {}
+        self._in_use = 0
+        self._waiting = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def getconn(self):
+        start = time.perf_counter()
+        with self._lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=self.timeout)
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self._timeouts += 1
+        if not acquired:
+            raise pool.PoolError(f"Timed out after {self.timeout}s waiting for a database connection")
+
+        try:
+            # Every idle connection may have been dropped together (a database
+            # restart), so keep going until one answers or the pool opens a new one
+            while True:
+                conn, idle_for = self._take()
+                if not self._needs_ping(idle_for) or self._is_alive(conn):
+                    break
+                self._give_back(conn, close=True)
+                with self._lock:
+                    self._discarded += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def putconn(self, conn):
+        close = conn.closed != 0
+        if not close:
+            try:
+                # Don't hand the next request a connection that is idle in transaction
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+        try:
+            self._give_back(conn, close=close)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                if close:
+                    self._discarded += 1
+            self._slots.release()
+
+    def _take(self):
+        """A connection and how long it sat idle, None if the pool just opened it"""
+        with self._pool_lock:
+            # The pool hands out an idle connection if it has one, else opens one
+            conn = self._pool.getconn()
+            if self._idle:
+                self._idle -= 1
+            returned_at = self._returned_at.pop(id(conn), None)
+        return conn, None if returned_at is None else time.monotonic() - returned_at
+
+    def _needs_ping(self, idle_for):
+        return self.pre_ping and idle_for is not None and idle_for >= self.pre_ping_idle
+
+    def _give_back(self, conn, close=False):
+        with self._pool_lock:
+            try:
+                self._pool.putconn(conn, close=close)
+            finally:
+                # Connections the pool doesn't keep (past min_size, broken) are closed
+                if not conn.closed:
+                    self._idle += 1
+                    self._returned_at[id(conn)] = time.monotonic()
+
+    def closeall(self):
+        with self._pool_lock:
+            self._pool.closeall()
+            self._idle = 0
+            self._returned_at.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": self._idle,
+                "waiting": self._waiting,
+                "acquired": self._acquired,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "wait_time_total_ms": round(self._wait_total * 1000, 2),
+                "wait_time_avg_ms": round(self._wait_total * 1000 / self._acquired, 2) if self._acquired else 0,
+                "wait_time_max_ms": round(self._wait_max * 1000, 2),
+            }
+
+    @staticmethod
+    def _is_alive(conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+
+_pool = None
+
+
+def init_pool():
+    """Create the app-wide connection pool (called from the FastAPI startup hook)"""
+    global _pool
+    if _pool is None:
+        _pool = DatabasePool()
+        logger.info("Database pool initialized (min={}, max={})", DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE)
+    return _pool
+
+
+def close_pool():
+    """Close every pooled connection (called from the FastAPI shutdown hook)"""
+    global _pool
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
+
+
+def get_pool_stats():
+    """Return usage stats for the connection pool, or None if it isn't running"""
+    return _pool.stats() if _pool is not None else None
+
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrow a connection outside of a request dependency.
+
+    For work that outlives the request handler, such as a StreamingResponse body,
+    which runs after dependencies with yield have already been closed.
+    """
+    db_pool = _pool
+    conn = db_pool.getconn() if db_pool is not None else connect()
+    try:
+        yield conn
+    finally:
+        if db_pool is not None:
+            db_pool.putconn(conn)
+        else:
+            conn.close()
+
+
+def get_db_connection():
+    """Dependency function to get database connection"""
+    try:
+        if _pool is not None:
+            db_pool = _pool
+            conn = db_pool.getconn()
+        else:
+            db_pool = None
+            conn = connect()
         # Make the connection a dependency
         try:
             yield conn
         finally:
-            conn.close()
+            if db_pool is not None:
+                db_pool.putconn(conn)
+            else:
+                conn.close()
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}")
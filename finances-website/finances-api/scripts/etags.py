@@ -0,0 +1,96 @@
+import hashlib
+from datetime import date
+from fastapi import Depends, HTTPException, Request, Response
+from scripts import reference_cache
+from scripts.async_db import get_async_db_connection
+from scripts.db import get_db_connection
+from scripts.log import logger
+
+
+def get_table_versions(cur, tables):
+    """{table: version} from table_versions, for the tables that have a counter"""
+    cur.execute(
+        "SELECT table_name, version FROM table_versions WHERE table_name = ANY(%s)",
+        (list(tables),)
+    )
+    return dict(cur.fetchall())
+
+
+async def get_table_versions_async(conn, tables):
+    """get_table_versions on an asyncpg connection"""
+    rows = await conn.fetch(
+        "SELECT table_name, version FROM table_versions WHERE table_name = ANY($1)",
+        list(tables)
+    )
+    return {row["table_name"]: row["version"] for row in rows}
+
+
+def make_etag(request: Request, versions):
+    """
+    Weak ETag for a GET: the URL, today's date (several endpoints are relative to
+    the current month or day) and the change counters of the tables it reads.
+    """
+    parts = [request.url.path, request.url.query, date.today().isoformat()]
+    parts.extend(f"{table}={version}" for table, version in sorted(versions.items()))
+    return f'W/"{hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match calls for
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+def check_versions(request: Request, response: Response, tables, versions):
+    """Answer 304 when the client's copy matches versions, otherwise set the ETag"""
+    # Cached reference rows older than these counters must not go out under them
+    reference_cache.sync_versions(versions)
+    if len(versions) < len(tables):
+        return
+
+    etag = make_etag(request, versions)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = etag
+    # Let browsers keep the body but revalidate it on every use
+    response.headers["Cache-Control"] = "no-cache"
+
+
+def conditional_get(*tables):
+    """
+    Route dependency that answers 304 Not Modified, before the handler or its
+    queries run, when none of the tables it reads has changed since the client's
+    copy. Otherwise the response carries the ETag to send back next time.
+
+    The counters are bumped once per writing transaction as it commits (schema
+    migrations 3 and 4). Responses that read a table without a counter get no ETag.
+    The counters are read on the request's own connection (FastAPI hands the
+    handler the same get_db_connection), so a request never holds two.
+    """
+    def dependency(request: Request, response: Response, conn = Depends(get_db_connection)):
+        try:
+            with conn.cursor() as cur:
+                versions = get_table_versions(cur, tables)
+        except Exception as e:
+            logger.error("Error reading table versions: {}", e)
+            # Leave the connection usable for the handler
+            conn.rollback()
+            return
+        check_versions(request, response, tables, versions)
+
+    return dependency
+
+
+def conditional_get_async(*tables):
+    """conditional_get for async routes, on the request's asyncpg connection"""
+    async def dependency(request: Request, response: Response, conn = Depends(get_async_db_connection)):
+        try:
+            versions = await get_table_versions_async(conn, tables)
+        except Exception as e:
+            logger.error("Error reading table versions: {}", e)
+            return
+        check_versions(request, response, tables, versions)
+
+    return dependency
@@ -0,0 +1,208 @@
+import os
+import asyncio
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from dotenv import load_dotenv
+from scripts import metrics, transaction_parser
+from scripts.log import logger
+
+# Load environment variables
+load_dotenv()
+
+# Ingest worker parameters
+INGEST_WORKER_ENABLED = os.getenv("INGEST_WORKER_ENABLED", "true").lower() in ("1", "true", "yes")
+# How often to look for new or changed statement files
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "30"))
+# Re-run even when nothing changed after this long (0 disables the schedule)
+INGEST_INTERVAL_SECONDS = float(os.getenv("INGEST_INTERVAL_SECONDS", "3600"))
+
+# Finished jobs kept for GET /transactions/ingest/jobs
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "20"))
+
+_task = None
+_current_job = None
+_jobs = deque(maxlen=INGEST_JOB_HISTORY)
+_runs = 0
+_directory_signature = None
+_last_run = 0.0
+
+
+class IngestJob:
+    """One ingest run, shared by every trigger that arrives while it is queued or running"""
+
+    def __init__(self, reason):
+        self.id = uuid.uuid4().hex[:12]
+        self.reason = reason
+        self.state = "queued"
+        self.joined = 0
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.queued_ms = None
+        self.duration_ms = None
+        self.counts = None
+        self.error = None
+        self.done = asyncio.get_running_loop().create_future()
+        self.task = None
+
+    async def wait(self):
+        """The finished job as a dict; cancelling the waiter leaves the job running"""
+        return await asyncio.shield(self.done)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "reason": self.reason,
+            "state": self.state,
+            "joined": self.joined,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "queued_ms": self.queued_ms,
+            "duration_ms": self.duration_ms,
+            "counts": self.counts,
+            "error": self.error,
+        }
+
+
+def _get_directory_signature():
+    """Name, size and mtime of every file in the transaction data directory"""
+    directory = os.path.abspath(os.getenv("TRANSACTION_DATA_PATH", "./transaction_data"))
+    if not os.path.isdir(directory):
+        return ()
+
+    signature = []
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            stat = entry.stat()
+            signature.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(signature))
+
+
+def submit_ingest(reason="manual"):
+    """
+    Start an ingest job, or join the one already queued or running.
+
+    Only one job runs per process at a time; parse_transactions also takes a
+    Postgres advisory lock, so runs in other pods wait rather than race on the
+    same files and misformatted ids. Returns (job, joined).
+    """
+    global _current_job
+    if _current_job is not None:
+        _current_job.joined += 1
+        return _current_job, True
+
+    job = IngestJob(reason)
+    _current_job = job
+    _jobs.appendleft(job)
+    job.task = asyncio.create_task(_run_job(job))
+    return job, False
+
+
+async def run_ingest(reason="manual"):
+    """Run an ingest (or join the running one) and wait for its outcome"""
+    job, _ = submit_ingest(reason)
+    return await job.wait()
+
+
+async def _run_job(job):
+    global _current_job, _directory_signature, _last_run, _runs
+
+    job.state = "running"
+    job.started_at = datetime.now()
+    job.queued_ms = int((job.started_at - job.created_at).total_seconds() * 1000)
+    start_time = time.perf_counter()
+
+    signature = _get_directory_signature()
+    try:
+        # parse_transactions hands its pandas and psycopg2 work to executors
+        result = await transaction_parser.parse_transactions()
+        # None only when it couldn't connect; other failures raise
+        if result is None:
+            raise RuntimeError("Ingest could not connect to the database")
+        job.counts = result
+        job.state = "succeeded"
+        _directory_signature = signature
+    except asyncio.CancelledError:
+        job.state = "cancelled"
+        raise
+    except Exception as e:
+        logger.error("Ingest job {} failed: {}", job.id, e)
+        job.state = "failed"
+        job.error = str(e)
+    finally:
+        _last_run = time.time()
+        _runs += 1
+        job.finished_at = datetime.now()
+        job.duration_ms = int((time.perf_counter() - start_time) * 1000)
+        _current_job = None
+        metrics.observe_ingest_job(job)
+        job.done.set_result(job.to_dict())
+
+
+async def _worker_loop():
+    # Run once at startup so the first page load sees current data
+    reason = "startup"
+    while True:
+        if reason is not None:
+            try:
+                await run_ingest(reason)
+            except Exception as e:
+                logger.error("Ingest worker error: {}", e)
+
+        await asyncio.sleep(INGEST_POLL_SECONDS)
+        reason = None
+        if _get_directory_signature() != _directory_signature:
+            reason = "new files"
+        elif INGEST_INTERVAL_SECONDS > 0 and time.time() - _last_run >= INGEST_INTERVAL_SECONDS:
+            reason = "schedule"
+
+
+def start_ingest_worker():
+    """Start the background ingest task (called from the FastAPI startup hook)"""
+    global _task
+    if not INGEST_WORKER_ENABLED or _task is not None:
+        return
+    _task = asyncio.create_task(_worker_loop())
+    logger.info("Ingest worker started (poll={}s, interval={}s)", INGEST_POLL_SECONDS, INGEST_INTERVAL_SECONDS)
+
+
+async def stop_ingest_worker():
+    """Cancel the background ingest task and any running job (called from the FastAPI shutdown hook)"""
+    global _task
+    tasks = [task for task in (_task, _current_job.task if _current_job else None) if task is not None]
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _task = None
+
+
+def get_ingest_job(job_id):
+    """A job by id, or None if it has aged out of the history"""
+    for job in _jobs:
+        if job.id == job_id:
+            return job.to_dict()
+    return None
+
+
+def get_ingest_jobs():
+    """Recent jobs, newest first"""
+    return [job.to_dict() for job in _jobs]
+
+
+def get_ingest_status():
+    """Return the state of the ingest worker, its current job and its last finished one"""
+    finished = next((job for job in _jobs if job.finished_at is not None), None)
+    return {
+        "state": "running" if _current_job is not None else "idle",
+        "enabled": INGEST_WORKER_ENABLED,
+        "runs": _runs,
+        "current_job": _current_job.to_dict() if _current_job is not None else None,
+        "last_job": finished.to_dict() if finished is not None else None,
+    }
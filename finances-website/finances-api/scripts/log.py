@@ -0,0 +1,86 @@
+import os
+import queue
+import sys
+import threading
+from loguru import logger
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# INFO for a few lines per request or file, DEBUG for parser details, TRACE for per-row output
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# One JSON object per line, with the extra fields as keys, instead of plain text
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() in ("1", "true", "yes")
+# Write from a background thread so the event loop and the parser never wait on stderr
+LOG_BUFFERED = os.getenv("LOG_BUFFERED", "true").lower() in ("1", "true", "yes")
+
+
+class BufferedStream:
+    """
+    A loguru sink that hands formatted lines to a writer thread, which writes
+    whatever has queued up in one call. Callers never block on a slow or full
+    stderr pipe. loguru's own enqueue=True pickles every record through a
+    multiprocessing queue, which costs more than the write it saves.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        self._queue.put(message)
+
+    def stop(self):
+        """Write everything queued so far and end the thread (loguru calls this on remove)"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None
+            if stopping:
+                batch.pop()
+            if batch:
+                try:
+                    self.stream.write("".join(batch))
+                    self.stream.flush()
+                except Exception:
+                    pass
+            if stopping:
+                return
+
+
+def _format(record):
+    """Plain text, with any bound or keyword fields appended as key=value"""
+    fields = " ".join(f"{key}={value}" for key, value in record["extra"].items())
+    record["extra"]["_fields"] = f" | {fields}" if fields else ""
+    return "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <7} | {name}:{line} | {message}{extra[_fields]}\n{exception}"
+
+
+def configure():
+    """
+    Replace loguru's default stderr handler with one at LOG_LEVEL. Messages below the
+    level return before their arguments are formatted, so call sites should pass
+    values as arguments (logger.debug("Read {} rows", n)) rather than f-strings.
+    """
+    logger.remove()
+    logger.add(
+        BufferedStream(sys.stderr) if LOG_BUFFERED else sys.stderr,
+        level=LOG_LEVEL,
+        format="{message}" if LOG_JSON else _format,
+        serialize=LOG_JSON,
+        backtrace=False,
+        diagnose=False,
+    )
+
+
+configure()
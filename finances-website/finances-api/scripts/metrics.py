@@ -0,0 +1,233 @@
+import bisect
+import threading
+from scripts.log import logger
+
+# Prometheus text exposition format, served by GET /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+INGEST_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_metrics = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric with a fixed set of label names; values are kept per label tuple"""
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        if not self.label_names:
+            self._values[()] = 0
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Bucket counts are stored per bucket and only made cumulative when scraped"""
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # [per-bucket counts (+Inf last), sum]
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        names = self.label_names + ("le",)
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            suffix = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Collector:
+    """Gauges read from a stats function at scrape time instead of on every update"""
+
+    def __init__(self, collect):
+        self.collect = collect
+        _metrics.append(self)
+
+    def render(self):
+        try:
+            return self.collect()
+        except Exception as e:
+            logger.error("Error collecting metrics: {}", e)
+            return []
+
+
+# HTTP requests, recorded by the middleware in main.py
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests currently being served", ("method",)
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route template",
+    ("method", "route", "status")
+)
+
+# Database statements, timed by the pooled connections
+db_query_duration_seconds = Histogram(
+    "db_query_duration_seconds", "Time to execute a database statement, by statement type",
+    ("pool", "statement"), buckets=QUERY_BUCKETS
+)
+db_query_errors_total = Counter(
+    "db_query_errors_total", "Database statements that raised an error", ("pool", "statement")
+)
+
+# Ingest jobs, recorded by the ingest worker
+ingest_jobs_total = Counter("ingest_jobs_total", "Finished ingest jobs, by outcome", ("state",))
+ingest_job_duration_seconds = Histogram(
+    "ingest_job_duration_seconds", "Time to run an ingest job", ("state",), buckets=INGEST_BUCKETS
+)
+ingest_files_total = Counter("ingest_files_total", "Statement files parsed (skipped files aren't counted)")
+ingest_files_skipped_total = Counter("ingest_files_skipped_total", "Statement files skipped as unchanged")
+ingest_rows_parsed_total = Counter("ingest_rows_parsed_total", "Transaction rows parsed from statement files")
+ingest_rows_inserted_total = Counter("ingest_rows_inserted_total", "Transaction rows inserted")
+ingest_rows_duplicate_total = Counter("ingest_rows_duplicate_total", "Transaction rows skipped as already stored")
+ingest_rows_misformatted_total = Counter("ingest_rows_misformatted_total", "Rows that couldn't be parsed")
+ingest_rows_categorized_total = Counter("ingest_rows_categorized_total", "Transaction rows auto-categorized")
+
+
+def statement_type(query):
+    """First keyword of a statement (SELECT, INSERT, ...), a label with a handful of values"""
+    if isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    words = str(query).lstrip(" \t\r\n(").split(None, 1)
+    return words[0].upper() if words else ""
+
+
+def observe_query(pool, query, seconds, failed=False):
+    statement = statement_type(query)
+    db_query_duration_seconds.observe(pool, statement, value=seconds)
+    if failed:
+        db_query_errors_total.inc(pool, statement)
+
+
+def observe_ingest_job(job):
+    """Record a finished IngestJob"""
+    ingest_jobs_total.inc(job.state)
+    if job.duration_ms is not None:
+        ingest_job_duration_seconds.observe(job.state, value=job.duration_ms / 1000)
+    counts = job.counts or {}
+    ingest_files_total.inc(amount=counts.get("files", 0))
+    ingest_files_skipped_total.inc(amount=counts.get("skipped", 0))
+    ingest_rows_parsed_total.inc(amount=counts.get("transactions", 0))
+    ingest_rows_inserted_total.inc(amount=counts.get("inserted", 0))
+    ingest_rows_duplicate_total.inc(amount=counts.get("duplicates", 0))
+    ingest_rows_misformatted_total.inc(amount=counts.get("misformatted", 0))
+    ingest_rows_categorized_total.inc(amount=counts.get("categorized", 0))
+
+
+def _collect_pool_stats():
+    """Connection pool gauges and counters from DatabasePool.stats and AsyncDatabasePool.stats"""
+    # The pools import this module to time their statements
+    from scripts.db import get_pool_stats
+    from scripts.async_db import get_async_pool_stats
+
+    pools = [("sync", get_pool_stats()), ("async", get_async_pool_stats())]
+    pools = [(name, stats) for name, stats in pools if stats is not None]
+    families = [
+        ("db_pool_max_size", "gauge", "Most connections the pool will open",
+         lambda s: [((), s["max_size"])]),
+        ("db_pool_connections", "gauge", "Pooled connections, by state",
+         lambda s: [(("in_use",), s["in_use"]), (("idle",), s["idle"])]),
+        ("db_pool_waiting", "gauge", "Requests waiting for a connection",
+         lambda s: [((), s["waiting"])]),
+        ("db_pool_acquired_total", "counter", "Connections handed out",
+         lambda s: [((), s["acquired"])]),
+        ("db_pool_timeouts_total", "counter", "Requests that gave up waiting for a connection",
+         lambda s: [((), s["timeouts"])]),
+        ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection",
+         lambda s: [((), s["wait_time_total_ms"] / 1000)]),
+        ("db_pool_wait_seconds_max", "gauge", "Longest wait for a connection",
+         lambda s: [((), s["wait_time_max_ms"] / 1000)]),
+    ]
+    lines = []
+    for name, kind, documentation, samples in families:
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+        for pool, stats in pools:
+            for labels, value in samples(stats):
+                label_names = ("pool",) + (("state",) if labels else ())
+                lines.append(f"{name}{_format_labels(label_names, (pool,) + labels)} {_format_value(value)}")
+    return lines
+
+
+Collector(_collect_pool_stats)
+
+
+def render():
+    """Every metric in the Prometheus text format"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,289 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+from scripts import metrics
+from scripts.log import logger
+
+# Load environment variables
+load_dotenv()
+
+# Statements slower than this are logged, with their plan
+QUERY_SLOW_MS = float(os.getenv("QUERY_SLOW_MS", "250"))
+QUERY_EXPLAIN_SLOW = os.getenv("QUERY_EXPLAIN_SLOW", "true").lower() in ("1", "true", "yes")
+# Slow statements kept for GET /admin/queries
+QUERY_SLOW_LOG_SIZE = int(os.getenv("QUERY_SLOW_LOG_SIZE", "50"))
+# Distinct fingerprints tracked; anything past this is counted under "other"
+QUERY_STATS_MAX_FINGERPRINTS = int(os.getenv("QUERY_STATS_MAX_FINGERPRINTS", "500"))
+
+# Statement types EXPLAIN accepts
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "VALUES")
+
+# The request being served, set by the middleware in main.py. Sync routes run in
+# the threadpool with a copy of the context, so their queries see it too.
+request_scope = ContextVar("request_scope", default=None)
+
+_lock = threading.Lock()
+_stats = {}
+_slow_queries = deque(maxlen=QUERY_SLOW_LOG_SIZE)
+_since = datetime.now()
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDERS = re.compile(r"%\(\w+\)s|%s|\$\d+|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED_LISTS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_WHITESPACE = re.compile(r"\s+")
+# Statements longer than this (characters) are fingerprinted without the cache
+FINGERPRINT_CACHE_MAX_LENGTH = 4096
+
+
+def query_text(query, connection=None):
+    if isinstance(query, bytes):
+        return query.decode(errors="replace")
+    if hasattr(query, "as_string"):
+        return query.as_string(connection)
+    return str(query)
+
+
+def fingerprint(query):
+    """
+    The statement with literals, parameters and value lists replaced by ?, so the
+    same query with different arguments (or execute_values pages) groups together.
+    """
+    # Long texts are mostly inlined values (execute_values pages) that never repeat,
+    # and would only push the short, repeated statements out of the cache
+    if len(query) > FINGERPRINT_CACHE_MAX_LENGTH:
+        return _fingerprint(query)
+    return _cached_fingerprint(query)
+
+
+def _fingerprint(query):
+    text = _COMMENTS.sub(" ", query)
+    text = _STRINGS.sub("?", text)
+    text = _PLACEHOLDERS.sub("?", text)
+    text = _LISTS.sub("(?)", text)
+    text = _REPEATED_LISTS.sub("(?), ...", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+_cached_fingerprint = lru_cache(maxsize=1024)(_fingerprint)
+
+
+def current_route():
+    """"GET /transactions/{id}" for the request being served, or "background" outside one"""
+    scope = request_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return f"{scope.get('method')} {route.path if route is not None else scope.get('path')}"
+
+
+def record(pool, query, seconds, rows=None, failed=False):
+    """Add one statement to the per-fingerprint stats; returns (fingerprint, route)"""
+    text = fingerprint(query)
+    statement = metrics.statement_type(text)
+    route = current_route()
+    duration_ms = seconds * 1000
+
+    metrics.observe_query(pool, text, seconds, failed)
+    with _lock:
+        stats = _stats.get(text)
+        if stats is None:
+            if len(_stats) >= QUERY_STATS_MAX_FINGERPRINTS:
+                text = "other"
+                stats = _stats.get(text)
+            if stats is None:
+                stats = _stats[text] = {
+                    "fingerprint": text,
+                    "statement": statement if text != "other" else "",
+                    "pools": set(),
+                    "calls": 0,
+                    "errors": 0,
+                    "rows": 0,
+                    "slow": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "routes": {},
+                    "last_seen": None,
+                }
+        stats["pools"].add(pool)
+        stats["calls"] += 1
+        stats["errors"] += failed
+        stats["rows"] += rows if rows is not None and rows > 0 else 0
+        stats["slow"] += duration_ms >= QUERY_SLOW_MS
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        stats["routes"][route] = stats["routes"].get(route, 0) + 1
+        stats["last_seen"] = time.time()
+    return text, route
+
+
+def log_slow_query(text, route, query, seconds, rows=None, plan=None):
+    """Keep a slow statement for GET /admin/queries and print it"""
+    duration_ms = round(seconds * 1000, 2)
+    _slow_queries.appendleft({
+        "at": datetime.now().isoformat(),
+        "fingerprint": text,
+        "query": query[:2000],
+        "route": route,
+        "duration_ms": duration_ms,
+        "rows": rows,
+        "plan": plan,
+    })
+    logger.bind(duration_ms=duration_ms, rows=rows, route=route).warning(
+        "Slow query: {}{}", text[:500], "".join(f"\n    {line}" for line in plan or ())
+    )
+
+
+def explain(connection, query, vars=None):
+    """
+    EXPLAIN (without ANALYZE, so nothing runs twice) a statement that just ran on
+    connection. A plain cursor keeps the plan out of the stats, and a savepoint
+    keeps a failed EXPLAIN from aborting the caller's transaction.
+    """
+    if connection.closed or connection.get_transaction_status() == extensions.TRANSACTION_STATUS_INERROR:
+        return None
+    prefix = b"EXPLAIN " if isinstance(query, bytes) else "EXPLAIN "
+    in_transaction = not connection.autocommit
+    cur = extensions.cursor(connection)
+    try:
+        if in_transaction:
+            cur.execute("SAVEPOINT query_explain")
+        try:
+            cur.execute(prefix + query, vars)
+            plan = [row[0] for row in cur.fetchall()]
+        except Exception as e:
+            if in_transaction:
+                cur.execute("ROLLBACK TO SAVEPOINT query_explain")
+            return [f"EXPLAIN failed: {str(e).strip()}"]
+        if in_transaction:
+            cur.execute("RELEASE SAVEPOINT query_explain")
+        return plan
+    except Exception as e:
+        logger.error("Error explaining slow query: {}", e)
+        return None
+    finally:
+        cur.close()
+
+
+class InstrumentedCursorMixin:
+    """
+    Records every statement's fingerprint, duration, rows and calling route, and
+    logs (with its plan) any statement slower than QUERY_SLOW_MS.
+    """
+
+    def _observe(self, query, vars, start, failed):
+        seconds = time.perf_counter() - start
+        # Named (server-side) cursors don't know their row count until fetched
+        rows = self.rowcount if self.rowcount >= 0 and not self.name else None
+        try:
+            text, route = record("sync", query_text(query, self.connection), seconds, rows, failed)
+            if seconds * 1000 >= QUERY_SLOW_MS:
+                plan = None
+                if QUERY_EXPLAIN_SLOW and not failed and metrics.statement_type(text) in EXPLAINABLE:
+                    plan = explain(self.connection, query, vars)
+                log_slow_query(text, route, query_text(query, self.connection), seconds, rows, plan)
+        except Exception as e:
+            logger.error("Error recording query stats: {}", e)
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, vars)
+            failed = False
+            return result
+        finally:
+            self._observe(query, vars, start, failed)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(query, vars_list)
+            failed = False
+            return result
+        finally:
+            self._observe(query, None, start, failed)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().copy_expert(sql, file, size)
+            failed = False
+            return result
+        finally:
+            self._observe(sql, None, start, failed)
+
+
+_instrumented_cursor_classes = {}
+
+
+def instrumented_cursor_class(cursor_class):
+    """cursor_class (RealDictCursor, ...) with InstrumentedCursorMixin, created once per class"""
+    if issubclass(cursor_class, InstrumentedCursorMixin):
+        return cursor_class
+    instrumented = _instrumented_cursor_classes.get(cursor_class)
+    if instrumented is None:
+        instrumented = type(f"Instrumented{cursor_class.__name__}", (InstrumentedCursorMixin, cursor_class), {})
+        _instrumented_cursor_classes[cursor_class] = instrumented
+    return instrumented
+
+
+# Drop-in for cursor_factory=RealDictCursor on connections that aren't instrumented
+InstrumentedCursor = instrumented_cursor_class(RealDictCursor)
+
+
+class InstrumentedConnection(extensions.connection):
+    """Connection whose cursors, whatever their cursor_factory, are instrumented"""
+
+    def cursor(self, *args, **kwargs):
+        cursor_class = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+        kwargs["cursor_factory"] = instrumented_cursor_class(cursor_class)
+        return super().cursor(*args, **kwargs)
+
+
+def get_query_stats(sort="total_ms", limit=50):
+    """Per-fingerprint stats, largest first by sort"""
+    with _lock:
+        rows = [dict(stats, pools=sorted(stats["pools"]), routes=dict(stats["routes"])) for stats in _stats.values()]
+    for row in rows:
+        row["mean_ms"] = round(row["total_ms"] / row["calls"], 3) if row["calls"] else 0
+        row["total_ms"] = round(row["total_ms"], 3)
+        row["max_ms"] = round(row["max_ms"], 3)
+        row["last_seen"] = datetime.fromtimestamp(row["last_seen"]).isoformat() if row["last_seen"] else None
+    rows.sort(key=lambda row: row[sort], reverse=True)
+    return rows[:limit]
+
+
+def get_slow_queries():
+    """Recent slow statements, newest first"""
+    return list(_slow_queries)
+
+
+def get_settings():
+    return {
+        "since": _since.isoformat(),
+        "slow_ms": QUERY_SLOW_MS,
+        "explain_slow": QUERY_EXPLAIN_SLOW,
+        "fingerprints": len(_stats),
+        "max_fingerprints": QUERY_STATS_MAX_FINGERPRINTS,
+    }
+
+
+def reset_query_stats():
+    """Forget every fingerprint and slow statement recorded so far"""
+    global _since
+    with _lock:
+        _stats.clear()
+        _slow_queries.clear()
+        _since = datetime.now()
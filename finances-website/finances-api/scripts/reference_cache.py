@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# How long a cached reference table is served before it is read again. Write
+# routes invalidate explicitly and conditional_get drops tables whose change
+# counter moved, so this only bounds staleness on routes without an ETag
+REFERENCE_CACHE_TTL_SECONDS = float(os.getenv("REFERENCE_CACHE_TTL_SECONDS", "300"))
+
+# Rows of each small, rarely written table, in the order the API serves them
+REFERENCE_QUERIES = {
+    "categories": "SELECT name, rank FROM categories ORDER BY rank",
+    "budget": "SELECT category, amount FROM budget",
+    "income": """
+        SELECT year, month, amount
+        FROM income
+        ORDER BY year, array_position(
+            ARRAY['January', 'February', 'March', 'April', 'May', 'June', 'July',
+                  'August', 'September', 'October', 'November', 'December'],
+            month
+        )
+    """,
+    "rent": "SELECT year, month, amount FROM rent ORDER BY year, month",
+}
+
+
+class ReferenceCache:
+    """
+    Whole-table cache for the reference tables, with a TTL and explicit invalidation.
+
+    sync_versions drops a table whenever its table_versions counter moves past
+    the newest one seen, so entries are never older than that counter. Cached rows are
+    tuples of plain values shared between requests, so callers must build new
+    objects instead of mutating them. A load that races with an invalidation is
+    served to its caller but not stored.
+    """
+
+    def __init__(self, ttl=REFERENCE_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generations = {table: 0 for table in REFERENCE_QUERIES}
+        # Newest table_versions counter seen per table
+        self._versions = {}
+        self._counters = {
+            table: {"hits": 0, "misses": 0, "invalidations": 0} for table in REFERENCE_QUERIES
+        }
+
+    def get(self, cur, table):
+        """Rows of table as (column, ...) tuples, read through the cache"""
+        rows, generation, now = self._lookup(table)
+        if rows is not None:
+            return rows
+
+        # Plain cursor, whatever cursor_factory the caller's cursor uses
+        with cur.connection.cursor() as plain:
+            plain.execute(REFERENCE_QUERIES[table])
+            rows = tuple(tuple(row) for row in plain.fetchall())
+        return self._store(table, generation, now, rows)
+
+    async def get_async(self, conn, table):
+        """get() for an asyncpg connection"""
+        rows, generation, now = self._lookup(table)
+        if rows is not None:
+            return rows
+
+        rows = tuple(tuple(record) for record in await conn.fetch(REFERENCE_QUERIES[table]))
+        return self._store(table, generation, now, rows)
+
+    def _lookup(self, table):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(table)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._counters[table]["hits"] += 1
+                return entry[1], None, now
+            self._counters[table]["misses"] += 1
+            return None, self._generations[table], now
+
+    def _store(self, table, generation, now, rows):
+        with self._lock:
+            if self._generations[table] == generation:
+                self._entries[table] = (now, rows)
+        return rows
+
+    def invalidate(self, *tables):
+        """Drop the given tables (every table if none are given)"""
+        with self._lock:
+            for table in tables or REFERENCE_QUERIES:
+                self._drop(table)
+
+    def _drop(self, table):
+        self._entries.pop(table, None)
+        self._generations[table] += 1
+        self._counters[table]["invalidations"] += 1
+
+    def sync_versions(self, versions):
+        """
+        Drop cached tables whose table_versions counter is newer than any seen
+        before. conditional_get passes the counters it read before the handler
+        runs, so a write from psql or another pod is served with the ETag that
+        describes it rather than after the TTL. Loads already in flight may have
+        read the old rows, so the generation moves too and they aren't stored.
+        """
+        with self._lock:
+            for table, version in versions.items():
+                if table not in self._generations:
+                    continue
+                known = self._versions.get(table)
+                if known is not None and version <= known:
+                    continue
+                self._versions[table] = version
+                self._drop(table)
+
+    def stats(self):
+        with self._lock:
+            hits = sum(c["hits"] for c in self._counters.values())
+            misses = sum(c["misses"] for c in self._counters.values())
+            return {
+                "ttl_seconds": self.ttl,
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+                "tables": {
+                    table: dict(counters, version=self._versions.get(table))
+                    for table, counters in self._counters.items()
+                },
+            }
+
+
+_cache = ReferenceCache()
+
+
+def get_categories(cur):
+    """[(name, rank), ...] ordered by rank"""
+    return _cache.get(cur, "categories")
+
+
+async def get_categories_async(conn):
+    """get_categories() for an asyncpg connection"""
+    return await _cache.get_async(conn, "categories")
+
+
+def get_budget(cur):
+    """{category: amount}"""
+    return dict(_cache.get(cur, "budget"))
+
+
+def get_income(cur):
+    """[(year, month_name, amount), ...] in calendar order"""
+    return _cache.get(cur, "income")
+
+
+def get_rent(cur):
+    """[(year, month_name, amount), ...]"""
+    return _cache.get(cur, "rent")
+
+
+def get_month_amount(rows, year, month_name):
+    """Amount of an income or rent month, or None if there is no row for it"""
+    for row_year, row_month, amount in rows:
+        if row_year == year and row_month == month_name:
+            return amount
+    return None
+
+
+def invalidate(*tables):
+    _cache.invalidate(*tables)
+
+
+def sync_versions(versions):
+    _cache.sync_versions(versions)
+
+
+def get_cache_stats():
+    return _cache.stats()
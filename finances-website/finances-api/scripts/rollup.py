@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import sys
+from decimal import Decimal
+from psycopg2.extras import execute_values
+from scripts.db import connect
+
+# monthly_category_totals holds SUM(amount) and COUNT(*) of transactions per
+# (year, month, category); uncategorized rows are kept under category ''
+CREATE_MONTHLY_CATEGORY_TOTALS = """
+    CREATE TABLE IF NOT EXISTS monthly_category_totals (
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        total NUMERIC(14,2) NOT NULL DEFAULT 0,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (year, month, category)
+    )
+"""
+
+# Upsert for grouped (year, month, category, total, count) rows
+UPSERT_TOTALS = """
+    INSERT INTO monthly_category_totals AS m (year, month, category, total, count)
+    {source}
+    ON CONFLICT (year, month, category) DO UPDATE SET
+        total = m.total + EXCLUDED.total,
+        count = m.count + EXCLUDED.count
+"""
+
+
+def create_table(cur):
+    cur.execute(CREATE_MONTHLY_CATEGORY_TOTALS)
+
+
+def merge_deltas(deltas):
+    """
+    Sum (year, month, category, total, count) deltas per bucket.
+
+    Use a negative total and count to take a transaction out of a bucket. Rows
+    without a year or month can't be bucketed and are ignored, like in rebuild().
+    """
+    merged = {}
+    for year, month, category, total, count in deltas:
+        if year is None or month is None:
+            continue
+        key = (int(year), int(month), category or "")
+        current = merged.get(key, (0, 0))
+        merged[key] = (current[0] + Decimal(str(total)), current[1] + count)
+    return [(year, month, category, total, count) for (year, month, category), (total, count) in merged.items()]
+
+
+def apply_deltas(cur, deltas):
+    """Add (year, month, category, total, count) deltas to the rollup"""
+    rows = merge_deltas(deltas)
+    if rows:
+        execute_values(cur, UPSERT_TOTALS.format(source="VALUES %s"), rows)
+
+
+async def apply_deltas_async(conn, deltas):
+    """apply_deltas for an asyncpg connection"""
+    rows = merge_deltas(deltas)
+    if rows:
+        await conn.executemany(UPSERT_TOTALS.format(source="VALUES ($1, $2, $3, $4, $5)"), rows)
+
+
+def add_transaction(cur, year, month, category, amount):
+    apply_deltas(cur, [(year, month, category, amount, 1)])
+
+
+async def add_transaction_async(conn, year, month, category, amount):
+    await apply_deltas_async(conn, [(year, month, category, amount, 1)])
+
+
+def move_deltas(year, month, old_category, new_category, amount):
+    """Deltas that move one transaction's amount between category buckets"""
+    if (old_category or "") == (new_category or ""):
+        return []
+    return [
+        (year, month, old_category, -amount, -1),
+        (year, month, new_category, amount, 1),
+    ]
+
+
+def move_transaction(cur, year, month, old_category, new_category, amount):
+    """Move one transaction's amount between category buckets after a re-categorization"""
+    apply_deltas(cur, move_deltas(year, month, old_category, new_category, amount))
+
+
+async def move_transaction_async(conn, year, month, old_category, new_category, amount):
+    await apply_deltas_async(conn, move_deltas(year, month, old_category, new_category, amount))
+
+
+def rebuild(cur):
+    """Recompute every bucket from transactions, e.g. to recover from drift"""
+    create_table(cur)
+    if not cur.connection.autocommit:
+        # Hold off concurrent ingests until the new totals are committed
+        cur.execute("LOCK TABLE monthly_category_totals IN EXCLUSIVE MODE")
+    cur.execute("DELETE FROM monthly_category_totals")
+    cur.execute("""
+        INSERT INTO monthly_category_totals (year, month, category, total, count)
+        SELECT year, month, COALESCE(category, ''), SUM(amount), COUNT(*)
+        FROM transactions
+        WHERE year IS NOT NULL AND month IS NOT NULL
+        GROUP BY year, month, COALESCE(category, '')
+    """)
+    return cur.rowcount
+
+
+def rebuild_if_empty(cur):
+    """Backfill the rollup the first time it is created on an existing database"""
+    create_table(cur)
+    cur.execute("SELECT EXISTS (SELECT 1 FROM monthly_category_totals)")
+    if cur.fetchone()[0]:
+        return 0
+    cur.execute("SELECT EXISTS (SELECT 1 FROM transactions)")
+    if not cur.fetchone()[0]:
+        return 0
+    return rebuild(cur)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python -m scripts.rollup rebuild")
+        sys.exit(1)
+
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            buckets = rebuild(cur)
+        conn.commit()
+        print(f"Rebuilt monthly_category_totals with {buckets} buckets")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error rebuilding monthly_category_totals: {str(e)}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,18 @@
 import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
+import numpy as np
 from models import transactions
-import uuid
-from datetime import datetime
-import json
-import math
+from scripts import bulk_load
+from scripts import card_formats
+from scripts import categorizer
+from scripts.query_stats import InstrumentedConnection
+from scripts.log import logger
 import string
+import hashlib
 import psycopg2
-from psycopg2.extras import execute_batch
 from dotenv import load_dotenv
 
 # Load environment variables for database connection
@@ -20,6 +25,16 @@ DB_NAME = os.getenv("POSTGRES_DB", "finances")
 DB_USER = os.getenv("POSTGRES_USER", "finances")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "")
 
+# Parse pool parameters, sized for the Pi's 4 cores and pod memory limits
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", "2"))
+# "thread" to share the API process, "process" for a spawned process pool (a fresh
+# interpreter per worker and run, so only where the pod's memory allows it)
+INGEST_EXECUTOR = os.getenv("INGEST_EXECUTOR", "thread").lower()
+# Files at least this large are streamed in chunks instead of read whole
+INGEST_STREAM_THRESHOLD_BYTES = int(os.getenv("INGEST_STREAM_THRESHOLD_BYTES", str(16 * 1024 * 1024)))
+# Rows per chunk when streaming, which bounds the parser's peak memory
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "20000"))
+
 def get_db_connection():
     """Establish a connection to PostgreSQL database"""
     try:
@@ -28,273 +43,491 @@ def get_db_connection():
             user=DB_USER,
             password=DB_PASSWORD,
             host=DB_HOST,
-            port=DB_PORT
+            port=DB_PORT,
+            connection_factory=InstrumentedConnection
         )
         return conn
     except Exception as e:
-        print(f"Database connection error: {str(e)}")
+        logger.error("Database connection error: {}", e)
         return None
 
 async def parse_transactions():
-    """Parse transactions from files and store in PostgreSQL"""
+    """Parse transactions from files and store in PostgreSQL; returns the summary, or None if it couldn't connect"""
     # Database connection
-    conn = get_db_connection()
+    conn = await asyncio.to_thread(get_db_connection)
     if not conn:
-        print("Failed to connect to database. Cannot process transactions.")
+        logger.error("Failed to connect to database. Cannot process transactions.")
         return
     
-    cur = conn.cursor()
-    
+    try:
+        await asyncio.to_thread(acquire_ingest_lock, conn)
+        with conn.cursor() as cur:
+            summary = await ingest_directory(conn, cur)
+    finally:
+        conn.close()
+    logger.info("Transaction processing completed: {}", summary)
+    return summary
+
+
+def acquire_ingest_lock(conn):
+    """
+    Wait until no other process is ingesting. Runs never race on the same files or
+    misformatted ids; the lock is held until the connection closes.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(hashtext('transaction_ingest'))")
+    conn.commit()
+
+
+async def ingest_directory(conn, cur):
+    """Parse and store every file in the transaction data directory"""
     # Get transaction data directory and print absolute path
     directory = os.getenv("TRANSACTION_DATA_PATH", "./transaction_data")
     abs_directory = os.path.abspath(directory)
-    print(f"TRANSACTION DATA DIRECTORY: {abs_directory}")
+    logger.debug("Transaction data directory: {}", abs_directory)
     
     # Check if directory exists
     if not os.path.exists(abs_directory):
-        print(f"WARNING: Directory does not exist: {abs_directory}")
+        logger.warning("Directory does not exist: {}", abs_directory)
         try:
             os.makedirs(abs_directory, exist_ok=True)
-            print(f"Created directory: {abs_directory}")
+            logger.info("Created directory: {}", abs_directory)
         except Exception as e:
-            print(f"Failed to create directory: {str(e)}")
-            return
+            # Not a connection failure, so don't come back as None like one
+            raise RuntimeError(f"Could not create transaction data directory {abs_directory}: {e}") from e
     
     # List all files in the directory
+    file_paths = []
     try:
         all_files = os.listdir(abs_directory)
-        print(f"Found {len(all_files)} files in directory:")
+        logger.info("Found {} files in {}", len(all_files), abs_directory)
         for f in all_files:
             full_path = os.path.join(abs_directory, f)
-            file_size = os.path.getsize(full_path) if os.path.isfile(full_path) else "N/A (directory)"
-            print(f"  - {f} ({file_size} bytes)")
+            if os.path.isfile(full_path):
+                logger.debug("  - {} ({} bytes)", f, os.path.getsize(full_path))
+                file_paths.append(full_path)
+            else:
+                logger.debug("  - {} (directory)", f)
     except Exception as e:
-        print(f"Error listing directory contents: {str(e)}")
-    
-    misformatted_transactions = []
+        logger.error("Error listing directory contents: {}", e)
     
-    for filename in os.listdir(abs_directory):
-        file_path = os.path.join(abs_directory, filename)
-        print(f"\n=== PROCESSING FILE: {file_path} ===")
-        
-        if not os.path.isfile(file_path):
-            print(f"Skipping non-file: {file_path}")
-            continue
-            
-        trans = None
-        mis_trans = None
-                
-        # File type detection and processing
-        if "discover" in file_path.lower():
-            print(f"Processing Discover file: {file_path}")
-            try:
-                df, mis_trans = read_csv_file(file_path=file_path, sep=",")
-                print(f"Discover file read successful. DataFrame shape: {df.shape}")
-                print(f"First row sample: {df.iloc[0].to_dict() if not df.empty else 'Empty DataFrame'}")
-                
-                trans = parse(
-                        df=df, 
-                        card_name="Discover",
-                        date_key="Trans. Date",
-                        date_conversion="%m/%d/%Y",
-                        debit_key="Amount",
-                        vendor_key="Description",
-                    )
-                print(f"Parsing complete. Transactions count: {len(trans) if trans else 0}")
-            except Exception as e:
-                print(f"Error processing Discover file: {str(e)}")
-                import traceback
-                print(traceback.format_exc())
-        elif "amex" in file_path.lower():
-            print(f"Processing AMEX file: {file_path}")
+    summary = {"files": 0, "skipped": 0, "transactions": 0, "inserted": 0, "duplicates": 0, "misformatted": 0, "categorized": 0}
+    checkpoints = await asyncio.to_thread(load_checkpoints, cur)
+    processed_hashes = {cp["file_hash"] for cp in checkpoints.values() if cp["file_hash"]}
+    format_cache = card_formats.get_format_cache()
+
+    # The pandas work runs in worker threads (or processes), never on the event loop
+    loop = asyncio.get_running_loop()
+    executor = create_parse_executor(len(file_paths))
+    try:
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, parse_file, file_path, checkpoints, processed_hashes, format_cache)
+            for file_path in file_paths
+        ), return_exceptions=True)
+    finally:
+        # Waiting here would block the event loop until every queued file finished
+        # parsing when the run is cancelled; by now the futures are normally all done
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # A file that blew up is left without a checkpoint so the next run retries it
+    for file_path, result in zip(file_paths, results):
+        if isinstance(result, Exception):
+            logger.error("Error processing {}: {}", file_path, result)
+    results = [result for result in results if not isinstance(result, Exception)]
+    for result in results:
+        if result["format"]:
+            format_cache[result["file_hash"]] = result["format"]
+
+    await asyncio.to_thread(store_results, conn, results, summary)
+
+    # Large files are parsed and stored chunk by chunk, one file at a time
+    for result in results:
+        if result["status"] == "stream":
             try:
-                card_name = "amex_blue" if "blue" in os.path.basename(file_path).lower() else "amex_delta"
-                print(f"Identified as {card_name}")
-                                
-                df, mis_trans = read_csv_file(file_path=file_path, sep=",")
-                print(f"AMEX file read status: DataFrame {'empty' if df.empty else f'shape={df.shape}'}")
-                
-                if not df.empty:
-                    print(f"First row sample: {df.iloc[0].to_dict() if len(df) > 0 else 'No rows'}")
-                
-                trans = parse(
-                        df=df, 
-                        card_name=card_name,
-                        date_key="Date",
-                        date_conversion="%m/%d/%Y",
-                        debit_key="Amount",
-                        vendor_key="Description",
-                    )
-                print(f"Parsing complete. Transactions count: {len(trans) if trans else 0}")
-            except Exception as e:
-                print(f"Error processing AMEX file: {str(e)}")
-                import traceback
-                print(traceback.format_exc())
-        elif "capone" in file_path.lower():
-            print(f"Processing Capital One file: {file_path}")
-            card_name = "capone_venture_x" if "x" in os.path.basename(file_path).lower() else "capone_venture"
-            df, mis_trans = read_csv_file(file_path=file_path, sep=",")
-            trans = parse(
-                    df=df, 
-                    card_name=card_name,
-                    date_key="Transaction Date",
-                    date_conversion="%Y-%m-%d",
-                    debit_key="Debit",
-                    vendor_key="Description",
-                    credit_key="Credit",
+                await asyncio.to_thread(
+                    stream_file, conn, result, checkpoints.get((result["card_name"], result["file_name"])), summary
                 )
-        elif "citi" in file_path.lower():
-            print(f"Processing Citi file: {file_path}")
-            card_name = "citi_custom" if "custom" in os.path.basename(file_path).lower() else "citi_double"
-            df, mis_trans = read_csv_file(file_path=file_path, sep='\t\t')
-            if not df.empty:
-                df.columns = [col.strip() for col in df.columns]                    
-                for col in df.columns:
-                    if df[col].dtype == 'object':
-                        df[col] = df[col].str.strip()
-            trans = parse(
-                    df=df, 
-                    card_name=card_name,
-                    date_key="Date",
-                    date_conversion="%m/%d/%Y",
-                    debit_key="Amount",
-                    vendor_key="Description",
-                )
-        elif "wellsfargo" in file_path.lower() or "bilt" in file_path.lower():
-            print(f"Processing Wells Fargo/Bilt file: {file_path}")
-            card_name = "wells_fargo" if "wellsfargo" in os.path.basename(file_path).lower() else "bilt"
-            df, mis_trans = read_csv_file(file_path=file_path, sep=",")
-            trans = parse(
-                    df=df, 
-                    card_name=card_name,
-                    date_key="Date",
-                    debit_key="Amount",
-                    vendor_key="Description",
+            except Exception as e:
+                logger.error("Error streaming {}: {}", result["file_path"], e)
+    return summary
+
+def create_parse_executor(file_count):
+    """Bounded pool for parse_file; processes are spawned so forked uvicorn state stays out of them"""
+    workers = max(1, min(INGEST_MAX_WORKERS, file_count))
+    if INGEST_EXECUTOR == "process" and workers > 1:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return ThreadPoolExecutor(max_workers=workers)
+
+def parse_file(file_path, checkpoints, processed_hashes, format_cache=None):
+    """
+    Read and parse one statement file without touching the database.
+
+    Runs inside the parse executor, so everything it returns must be picklable.
+    format_cache maps file hashes to detected format names; worker processes get a
+    copy, so the detected format is also returned for the caller to remember.
+    """
+    filename = os.path.basename(file_path)
+    logger.debug("Processing file: {}", file_path)
+    result = {
+        "file_name": filename,
+        "file_path": file_path,
+        "status": "parsed",
+        "card_name": None,
+        "file_hash": None,
+        "transactions": None,
+        "misformatted": [],
+        "row_count": 0,
+        "rows_hash": None,
+        "format": None,
+    }
+
+    file_hash = get_file_hash(file_path)
+    result["file_hash"] = file_hash
+    if file_hash in processed_hashes:
+        logger.info("Skipping unchanged file: {}", file_path)
+        result["status"] = "skipped"
+        return result
+        
+    trans = None
+    mis_trans = None
+    failed_rows = []
+    df = pd.DataFrame()
+
+    # Match the header against the registered layouts (cached by content hash)
+    card_format = card_formats.detect_format(file_path, file_hash, format_cache)
+    if card_format is None:
+        logger.warning("Skipping unrecognized file: {}", file_path)
+        result["status"] = "unrecognized"
+        return result
+
+    card_name = card_format.card_name_for(filename)
+    result["format"] = card_format.name
+    result["card_name"] = card_name
+
+    file_size = os.path.getsize(file_path)
+    if file_size >= INGEST_STREAM_THRESHOLD_BYTES:
+        # Reading this whole would risk the pod's memory limit, so stream_file
+        # handles it in chunks after the regular files are stored
+        logger.info("Streaming {} file ({} bytes): {}", card_format.name, file_size, file_path)
+        result["status"] = "stream"
+        return result
+
+    logger.info("Processing {} file as {}: {}", card_format.name, card_name, file_path)
+    try:
+        df, mis_trans = read_csv_file(file_path=file_path, card_format=card_format)
+        if card_format.strip_whitespace:
+            df = card_formats.strip_frame(df)
+        logger.debug("File read status: DataFrame shape {}", df.shape)
+
+        new_df, total_rows = select_unprocessed_rows(df, checkpoints.get((card_name, filename)))
+        trans, failed_rows = parse_frame(
+                df=new_df,
+                total_rows=total_rows,
+                card_name=card_name,
+                date_key=card_format.date_key,
+                date_conversion=card_format.date_format,
+                debit_key=card_format.debit_key,
+                vendor_key=card_format.vendor_key,
+                credit_key=card_format.credit_key,
+            )
+        logger.debug("Parsing complete. Transactions count: {}", len(trans) if trans is not None else 0)
+    except Exception as e:
+        logger.exception("Error processing {} file: {}", card_format.name, e)
+
+    result["card_name"] = card_name
+    result["transactions"] = trans
+    result["misformatted"] = (mis_trans or []) + failed_rows
+    # Only files that parsed get a checkpoint
+    if trans is not None and not df.empty:
+        result["row_count"] = len(df)
+        result["rows_hash"] = get_rows_hash(df)
+    return result
+
+def store_results(conn, results, summary):
+    """Write every parsed file's rows, misformatted rows and checkpoints in one transaction"""
+    cur = conn.cursor()
+    batches = []
+    misformatted_transactions = []
+
+    for result in results:
+        if result["status"] == "skipped":
+            summary["skipped"] += 1
+            continue
+        if result["status"] != "parsed":
+            continue
+
+        summary["files"] += 1
+        trans = result["transactions"]
+        if trans is not None and len(trans):
+            summary["transactions"] += len(trans)
+            batches.append(trans)
+        if result["misformatted"]:
+            logger.info("Found {} misformatted transactions in {}", len(result["misformatted"]), result["file_name"])
+            misformatted_transactions.extend(result["misformatted"])
+    summary["misformatted"] = len(misformatted_transactions)
+
+    categorized = []
+    skipped = 0
+    try:
+        if batches:
+            all_trans = transactions.TransactionBatch.concat(batches)
+            categorized = categorizer.categorize_batch(cur, all_trans)
+            summary["categorized"] += len(categorized)
+            logger.info("Attempting to insert {} transactions ({} auto-categorized)", len(all_trans), len(categorized))
+            inserted, skipped = bulk_load.copy_transactions(cur, all_trans)
+            summary["inserted"] += inserted
+            summary["duplicates"] += skipped
+            logger.info("Inserted {} transactions, skipped {} already stored", inserted, skipped)
+
+        if misformatted_transactions:
+            # Skipped files don't contribute rows, so new rows are numbered after the
+            # stored ones and rows that are already there are dropped
+            inserted, skipped = bulk_load.copy_misformatted_transactions(cur, misformatted_transactions)
+            logger.info("Inserted {} misformatted transactions, skipped {} already stored", inserted, skipped)
+
+        # Checkpoints move forward in the same commit as the rows they cover
+        for result in results:
+            if result["rows_hash"]:
+                save_checkpoint(
+                    cur,
+                    result["card_name"],
+                    result["file_name"],
+                    result["file_hash"],
+                    result["row_count"],
+                    result["rows_hash"]
                 )
+        conn.commit()
+    except Exception as e:
+        logger.error("Error storing parsed transactions: {}", e)
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    categorizer.record_categorized(categorized, stored_all=skipped == 0)
+
+def stream_file(conn, result, checkpoint, summary):
+    """
+    Parse and store one large statement file chunk by chunk.
+
+    The first pass keeps only an 8 byte hash per row, which gives the row count and
+    the checkpoint hashes that line ids and incremental parsing need. The second pass
+    parses and COPYs one chunk at a time, so peak memory depends on INGEST_CHUNK_ROWS
+    rather than the file size. The rows and the checkpoint commit together.
+    """
+    file_path = result["file_path"]
+    card_name = result["card_name"]
+    card_format = card_formats.get_card_format(result["format"])
+    file_size = os.path.getsize(file_path)
+
+    # Fall back to the Python engine if the file has rows that don't fit the header
+    read_options = {"engine": "c"}
+    try:
+        row_hashes = hash_statement_rows(file_path, card_format, read_options)
+    except pd.errors.ParserError as e:
+        logger.warning("Fast read failed: {}. Streaming with the Python engine.", e)
+        read_options = {"engine": "python", "on_bad_lines": lambda line: None}
+        row_hashes = hash_statement_rows(file_path, card_format, read_options)
+
+    total_rows = len(row_hashes)
+    rows_hash = hashlib.sha256(row_hashes.tobytes()).hexdigest()
+    cutoff = total_rows
+    last_line = (checkpoint or {}).get("last_line") or 0
+    if checkpoint and checkpoint["rows_hash"] and 0 < last_line <= total_rows:
+        if hashlib.sha256(row_hashes[total_rows - last_line:].tobytes()).hexdigest() == checkpoint["rows_hash"]:
+            cutoff = total_rows - last_line
+            logger.info("Checkpoint matched, parsing {} new rows out of {}", cutoff, total_rows)
         else:
-            print(f"Skipping unrecognized file: {file_path}")
-            continue
-                
-        if trans or mis_trans:
-            if mis_trans:
-                print(f"Found {len(mis_trans)} misformatted transactions")
-                misformatted_transactions.extend(mis_trans)
-            
-            if trans:
-                transaction_tuples = []
-                
-                for transaction in trans:
-                    transaction_tuple = (
-                        transaction.id,
-                        transaction.card_issuer,
-                        transaction.date,
-                        transaction.month,
-                        transaction.day,
-                        transaction.year,
-                        transaction.amount,
-                        transaction.vendor,
-                        transaction.category,
-                        transaction.line_id
-                    )
-                    transaction_tuples.append(transaction_tuple)
-                
-                try:
-                    if transaction_tuples:
-                        print(f"Attempting to insert {len(transaction_tuples)} transactions")
-                        # First, try a batch INSERT with ON CONFLICT DO NOTHING
-                        try:
-                            execute_batch(cur, """
-                                INSERT INTO transactions 
-                                (id, card_issuer, date, month, day, year, amount, vendor, category, line_id)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                ON CONFLICT DO NOTHING
-                            """, transaction_tuples)
-                            conn.commit()
-                            print(f"Successfully inserted transactions in batch")
-                        except psycopg2.errors.UniqueViolation:
-                            # If we get here, we have duplicates. Handle them one by one.
-                            conn.rollback()  # Roll back the failed batch operation
-                            print(f"Batch insert failed, processing transactions individually")
-                            
-                            # Process each transaction individually with ON CONFLICT DO NOTHING
-                            successful = 0
-                            for tup in transaction_tuples:
-                                try:
-                                    cur.execute("""
-                                        INSERT INTO transactions 
-                                        (id, card_issuer, date, month, day, year, amount, vendor, category, line_id)
-                                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                        ON CONFLICT DO NOTHING
-                                    """, tup)
-                                    conn.commit()
-                                    successful += 1
-                                except Exception as e:
-                                    # Skip this duplicate
-                                    conn.rollback()
-                                    print(f"Error inserting transaction: {str(e)}")
-                                    continue
-                            print(f"Individually inserted {successful} out of {len(transaction_tuples)} transactions")
-                                    
-                except Exception as e:
-                    # Log the error but continue
-                    print(f"Error inserting transactions: {str(e)}")
-                    conn.rollback()
-    
-    # Insert misformatted transactions into the database
-    if misformatted_transactions:
-        # Convert to a format that can be stored in PostgreSQL
-        print(f"Inserting {len(misformatted_transactions)} misformatted transactions")
-        for i, mis in enumerate(misformatted_transactions):
-            cur.execute("""
-                INSERT INTO misformatted_transactions (id, data)
-                VALUES (%s, %s)
-                ON CONFLICT DO NOTHING
-            """, (i, json.dumps(mis)))
-    
-    # Commit changes and close connection
-    conn.commit()
-    cur.close()
-    conn.close()
-    print("\nTransaction processing completed.")
+            logger.info("Checkpoint mismatch, parsing all {} rows", total_rows)
+    del row_hashes
+
+    irregular_rows = []
+    if read_options["engine"] == "python":
+        read_options["on_bad_lines"] = lambda line: irregular_rows.append(line)
+
+    file_summary = {"file_name": result["file_name"], "chunks": 0, "rows": 0, "bytes": 0}
+    categorized = []
+    stored_all = True
+    cur = conn.cursor()
+    try:
+        for chunk, bytes_read in card_formats.iter_statement(
+            file_path, card_format, INGEST_CHUNK_ROWS, **read_options
+        ):
+            if chunk.empty or chunk.index[0] >= cutoff:
+                break
+            chunk = chunk[chunk.index < cutoff]
+
+            trans, failed_rows = parse_frame(
+                df=chunk,
+                total_rows=total_rows,
+                card_name=card_name,
+                date_key=card_format.date_key,
+                date_conversion=card_format.date_format,
+                debit_key=card_format.debit_key,
+                vendor_key=card_format.vendor_key,
+                credit_key=card_format.credit_key,
+            )
+            chunk_categorized = categorizer.categorize_batch(cur, trans)
+            categorized.extend(chunk_categorized)
+            summary["categorized"] += len(chunk_categorized)
+            inserted, skipped = bulk_load.copy_transactions(cur, trans) if len(trans) else (0, 0)
+            stored_all = stored_all and skipped == 0
+
+            misformatted = irregular_rows + failed_rows
+            irregular_rows.clear()
+            if misformatted:
+                bulk_load.copy_misformatted_transactions(cur, misformatted)
+
+            file_summary["chunks"] += 1
+            file_summary["rows"] += len(chunk)
+            file_summary["bytes"] = bytes_read
+            summary["transactions"] += len(trans)
+            summary["inserted"] += inserted
+            summary["duplicates"] += skipped
+            summary["misformatted"] += len(misformatted)
+            logger.debug(
+                "Chunk {}: {} rows, {}/{} bytes read, {} inserted, {} skipped",
+                file_summary["chunks"], len(chunk), bytes_read, file_size, inserted, skipped
+            )
+
+        if total_rows > 0:
+            save_checkpoint(cur, card_name, result["file_name"], result["file_hash"], total_rows, rows_hash)
+        conn.commit()
+    except Exception as e:
+        logger.error("Error streaming {}: {}", file_path, e)
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    categorizer.record_categorized(categorized, stored_all)
+
+    summary["files"] += 1
+    summary.setdefault("streamed", []).append(file_summary)
+    logger.info("Streamed {} rows in {} chunks from {}", file_summary["rows"], file_summary["chunks"], file_path)
+    return file_summary
+
+def hash_statement_rows(file_path, card_format, read_options):
+    """Per-row hashes of a statement, matching get_rows_hash, read one chunk at a time"""
+    hashes = [np.empty(0, dtype=np.uint64)]
+    for chunk, _ in card_formats.iter_statement(file_path, card_format, INGEST_CHUNK_ROWS, **read_options):
+        hashes.append(pd.util.hash_pandas_object(chunk.astype(str), index=False).to_numpy())
+    return np.concatenate(hashes)
+
+def get_file_hash(file_path):
+    """SHA-256 of a file's contents, read in blocks"""
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def get_rows_hash(df):
+    """Order-sensitive hash of a DataFrame's row contents"""
+    row_hashes = pd.util.hash_pandas_object(df.astype(str), index=False)
+    return hashlib.sha256(row_hashes.values.tobytes()).hexdigest()
+
+def load_checkpoints(cur):
+    """Load the parse checkpoints from transaction_processing_state, keyed by (card_name, file_name)"""
+    cur.execute("""
+        SELECT card_name, file_name, last_line, file_hash, rows_hash
+        FROM transaction_processing_state
+    """)
+    return {
+        (row[0], row[1]): {"last_line": row[2], "file_hash": row[3], "rows_hash": row[4]}
+        for row in cur.fetchall()
+    }
+
+def save_checkpoint(cur, card_name, file_name, file_hash, row_count, rows_hash):
+    """Record that the first row_count rows of one of a card's files have been stored"""
+    cur.execute("""
+        INSERT INTO transaction_processing_state
+        (card_name, last_line, file_name, file_hash, rows_hash, updated_at)
+        VALUES (%s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (card_name, file_name) DO UPDATE SET
+            last_line = EXCLUDED.last_line,
+            file_hash = EXCLUDED.file_hash,
+            rows_hash = EXCLUDED.rows_hash,
+            updated_at = EXCLUDED.updated_at
+    """, (card_name, row_count, file_name, file_hash, rows_hash))
+
+def select_unprocessed_rows(df, checkpoint):
+    """
+    Return the rows of df that were not stored by the last run, plus the total row count.
+
+    line_id counts up from the last row of the DataFrame, so the rows stored last time
+    are the trailing `last_line` rows. If those still hash the same, only the leading
+    rows are new; otherwise the whole file is parsed again.
+    """
+    total_rows = len(df)
+    if df.empty or not checkpoint or not checkpoint["rows_hash"]:
+        return df, total_rows
+
+    last_line = checkpoint["last_line"] or 0
+    if last_line <= 0 or last_line > total_rows:
+        return df, total_rows
+
+    if get_rows_hash(df.iloc[total_rows - last_line:]) != checkpoint["rows_hash"]:
+        logger.info("Checkpoint mismatch, parsing all {} rows", total_rows)
+        return df, total_rows
+
+    logger.info("Checkpoint matched, parsing {} new rows out of {}", total_rows - last_line, total_rows)
+    return df.iloc[:total_rows - last_line], total_rows
 
 # Improved CSV file reading function
-def read_csv_file(file_path, sep=','):
-    print(f"Reading file: {file_path} with separator: '{sep}'")
+def read_csv_file(file_path, sep=',', card_format=None):
+    """
+    Read a statement file into a DataFrame plus a list of irregular rows.
+
+    With a card_format the file is read once by the C parser with known dtypes; the
+    sniffing and line-by-line paths below only run if that read fails.
+    """
+    if card_format is not None:
+        try:
+            df = card_formats.read_statement(file_path, card_format)
+            logger.debug("Read {} file. DataFrame shape: {}", card_format.name, df.shape)
+            return df, []
+        except pd.errors.EmptyDataError:
+            logger.warning("Empty file: {}", file_path)
+            return pd.DataFrame(), []
+        except Exception as e:
+            logger.warning("Fast read failed: {}. Falling back to the line-by-line reader.", e)
+            sep = card_format.legacy_sep
+
+    logger.debug("Reading file: {} with separator: {!r}", file_path, sep)
     try:
         # First try to use pandas directly
         try:
             if "citi" not in file_path.split("/")[-1]:
                 df = pd.read_csv(file_path, sep=None, engine='python')
-                print(f"Auto-detected CSV format. DataFrame shape: {df.shape}")
+                logger.debug("Auto-detected CSV format. DataFrame shape: {}", df.shape)
                 return df, []
             else:
                 raise Exception
         except Exception as e:
-            print(f"Auto-detection failed: {str(e)}. Trying with specified separator.")
+            logger.debug("Auto-detection failed: {}. Trying with specified separator.", e)
             
             # Read file contents
             with open(file_path, 'r') as f:
                 lines = f.readlines()
             
-            print(f"File read successfully. Total lines: {len(lines)}")
+            logger.debug("File read successfully. Total lines: {}", len(lines))
             
             if len(lines) == 0:
-                print("Warning: Empty file")
+                logger.warning("Empty file: {}", file_path)
                 return pd.DataFrame(), []
                 
             if sep == "\t\t":
-                print("Using tab separator for parsing")
+                logger.debug("Using tab separator for parsing")
                 try:
                     df = pd.read_csv(file_path, sep='\t\t', engine='python')
-                    print(f"DataFrame created with shape: {df.shape}")
+                    logger.debug("DataFrame created with shape: {}", df.shape)
                     return df, []
                 except Exception as e:
                     try:
                         df = pd.read_csv(file_path, sep=r'\s{2,}', engine='python')
-                        print(f"DataFrame created with shape: {df.shape}")
+                        logger.debug("DataFrame created with shape: {}", df.shape)
                         return df, []
                     except Exception as e:
-                        print(f"Error reading CSV with tabs: {str(e)}")
+                        logger.error("Error reading CSV with tabs: {}", e)
                         return pd.DataFrame(), []
             else:
                 try:
@@ -305,24 +538,24 @@ def read_csv_file(file_path, sep=','):
                         most_common = max(counts, key=counts.get)
                         
                         if counts[most_common] > counts[sep] and counts[most_common] > 0:
-                            print(f"Detected possible alternate separator: '{most_common}' (count: {counts[most_common]})")
-                            print(f"Original separator count: '{sep}' (count: {counts[sep]})")
+                            logger.debug("Detected possible alternate separator: {!r} (count: {})", most_common, counts[most_common])
+                            logger.debug("Original separator count: {!r} (count: {})", sep, counts[sep])
                             
                             # Try with the detected separator
                             try:
                                 df = pd.read_csv(file_path, sep=most_common)
                                 if len(df.columns) > 1:
-                                    print(f"Successfully parsed with detected separator. Shape: {df.shape}")
+                                    logger.debug("Successfully parsed with detected separator. Shape: {}", df.shape)
                                     return df, []
                             except:
-                                print("Failed with detected separator, continuing with original.")
+                                logger.debug("Failed with detected separator, continuing with original.")
                     
                     header = lines[0].strip().split(sep)
-                    print(f"Header found: {header}")
+                    logger.debug("Header found: {}", header)
 
                     # Get all rows and reverse them (newest first)
                     all_rows = [line.strip().split(sep) for line in lines[1:]]
-                    print(f"Total rows (excluding header): {len(all_rows)}")
+                    logger.debug("Total rows (excluding header): {}", len(all_rows))
                     all_rows.reverse()  # Newest transactions first
                     
                     regular_rows = []
@@ -332,30 +565,60 @@ def read_csv_file(file_path, sep=','):
                         if len(row) == len(header):
                             regular_rows.append(row)
                         else:
-                            print(f"Found irregular row: {row} (expected {len(header)} columns, got {len(row)})")
+                            logger.trace("Found irregular row: {} (expected {} columns, got {})", row, len(header), len(row))
                             irregular_rows.append(row)
 
-                    print(f"Regular rows: {len(regular_rows)}, Irregular rows: {len(irregular_rows)}")
+                    logger.debug("Regular rows: {}, Irregular rows: {}", len(regular_rows), len(irregular_rows))
                     if not regular_rows:
-                        print("Warning: No regular rows found")
+                        logger.warning("No regular rows found in {}", file_path)
                         return pd.DataFrame(), irregular_rows
                         
                     regular_df = pd.DataFrame(regular_rows, columns=header)
-                    print(f"Created DataFrame with shape: {regular_df.shape}")
+                    logger.debug("Created DataFrame with shape: {}", regular_df.shape)
                     
                     return regular_df, irregular_rows
                 except Exception as e:
-                    print(f"Error processing CSV: {str(e)}")
-                    import traceback
-                    print(traceback.format_exc())
+                    logger.exception("Error processing CSV: {}", e)
                     return pd.DataFrame(), []
     except Exception as e:
-        print(f"Error opening file: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error opening file: {}", e)
         return pd.DataFrame(), []
     
-def parse(
+def clean_amounts(column: pd.Series):
+    """
+    Strip '$' and spaces from an amount column and convert it to floats.
+
+    Returns the amounts plus a mask of cells that were blank and a mask of cells
+    that had content but could not be read as a number.
+    """
+    if pd.api.types.is_numeric_dtype(column):
+        amounts = column.astype(float)
+        return amounts, amounts.isna(), pd.Series(False, index=column.index)
+
+    cleaned = column.astype(str).str.replace('$', '', regex=False).str.replace(' ', '', regex=False)
+    blank = column.isna() | cleaned.isin(['', 'nan', 'None'])
+    amounts = pd.to_numeric(cleaned.where(~blank), errors='coerce')
+    return amounts, blank, amounts.isna() & ~blank
+
+# Character positions of the 32 hex digits inside a 36 character UUID string
+UUID_HEX_POSITIONS = [i for i in range(36) if i not in (8, 13, 18, 23)]
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+def generate_ids(count: int):
+    """Generate a batch of random UUID4s as 36 byte strings with numpy instead of one uuid4() per row"""
+    raw = np.frombuffer(os.urandom(16 * count), dtype=np.uint8).reshape(count, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+
+    nibbles = np.empty((count, 32), dtype=np.uint8)
+    nibbles[:, 0::2] = raw >> 4
+    nibbles[:, 1::2] = raw & 0x0F
+
+    chars = np.full((count, 36), ord('-'), dtype=np.uint8)
+    chars[:, UUID_HEX_POSITIONS] = HEX_DIGITS[nibbles]
+    return chars.view('S36').ravel()
+
+def parse_frame(
         df: pd.DataFrame,
         card_name: str,
         date_key: str,
@@ -363,13 +626,21 @@ def parse(
         debit_key: str,
         vendor_key: str,
         credit_key: str = "",
+        total_rows: int = None,
     ):
-    print(f"Parsing DataFrame for {card_name}")
-    print(f"Using keys - Date: '{date_key}', Debit: '{debit_key}', Vendor: '{vendor_key}', Credit: '{credit_key}'")
+    """
+    Column-wise conversion of a statement DataFrame into transaction rows.
+
+    Returns a TransactionBatch (ready for a bulk insert) and a list of rows that could
+    not be parsed, in the same shape as read_csv_file's irregular rows.
+    """
+    logger.debug("Parsing DataFrame for {}", card_name)
+    logger.debug("Using keys - Date: {!r}, Debit: {!r}, Vendor: {!r}, Credit: {!r}", date_key, debit_key, vendor_key, credit_key)
     
+    empty = transactions.TransactionBatch.empty()
     if df.empty:
-        print("Warning: Empty DataFrame, nothing to parse")
-        return []
+        logger.debug("Empty DataFrame, nothing to parse")
+        return empty, []
         
     # Check if the required columns exist
     required_columns = [date_key, vendor_key]
@@ -380,89 +651,84 @@ def parse(
         
     missing_columns = [col for col in required_columns if col not in df.columns]
     if missing_columns:
-        print(f"Error: Missing required columns: {missing_columns}")
-        print(f"Available columns are: {df.columns.tolist()}")
-        return []
-    
-    trans = []
+        logger.error("Missing required columns: {}", missing_columns)
+        logger.error("Available columns are: {}", df.columns.tolist())
+        return empty, []
 
-    num_rows = len(df) - 1
-    for index, row in df.iterrows():
-        try:
-            print(f"Processing row {index}")
-            line_id = num_rows - index
-            print(f"Line id {line_id}")
-            try:
-                date = datetime.strptime(row[date_key], date_conversion)
-                print(f"Date parsed: {date}")
-            except Exception as e:
-                print(f"Error parsing date '{row[date_key]}' with format '{date_conversion}': {str(e)}")
-                try:
-                    date = row[date_key].to_pydatetime()
-                    print(f"Fallback date parsing succeeded: {date}")
-                except Exception as e2:
-                    print(f"Fallback date parsing failed: {str(e2)}")
-                    continue
-
-            month = date.month
-            day = date.day
-            year = date.year
-            
-            if credit_key == "" or (debit_key in row and row[debit_key] != ''):
-                try:
-                    debit_value = str(row[debit_key]).replace('$', '').replace(' ', '')
-                    print(f"Raw debit value: '{row[debit_key]}', Cleaned: '{debit_value}'")
-                    cleaned_amount = float(debit_value)
-                    
-                    if cleaned_amount is not None and not math.isnan(cleaned_amount):
-                        new_trans = transactions.TransactionData(
-                                id=str(uuid.uuid4()),
-                                card_issuer=card_name,
-                                date=date, 
-                                year=year,
-                                month=month,
-                                day=day,
-                                amount=float(cleaned_amount),
-                                vendor=string.capwords(row[vendor_key].replace("\t", " ")),
-                                category="" ,
-                                line_id=line_id
-                            )
-                        print(f"Created transaction: {new_trans.vendor}, ${new_trans.amount:.2f}")
-                        trans.append(new_trans)
-                    else:
-                        print(f"Skipping row with NaN amount: {row[debit_key]}")
-                except Exception as e:
-                    print(f"Error parsing debit amount '{row[debit_key]}': {str(e)}")
-                    continue
-            elif credit_key != "" and credit_key in row and row[credit_key] is not None:
-                try:
-                    credit_value = str(row[credit_key]).replace('$', '').replace(' ', '')
-                    print(f"Raw credit value: '{row[credit_key]}', Cleaned: '{credit_value}'")
-                    cleaned_amount = float(credit_value)
-                    
-                    new_trans = transactions.TransactionData(
-                        id=str(uuid.uuid4()),
-                        card_issuer=card_name,
-                        date=date, 
-                        year=year,
-                        month=month,
-                        day=day,
-                        amount=float(cleaned_amount) * -1,
-                        vendor=string.capwords(row[vendor_key].replace("\t", " ")),
-                        category="" ,
-                        line_id=index
-                    )
-                    print(f"Created credit transaction: {new_trans.vendor}, ${new_trans.amount:.2f}")
-                    trans.append(new_trans)
-                except Exception as e:
-                    print(f"Error parsing credit amount '{row[credit_key]}': {str(e)}")
-                    continue
-            else:
-                print(f"Skipping row - no valid amount found: {row.to_dict()}")
-        except Exception as e:
-            print(f"Error processing row {index}: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
-    
-    print(f"Finished parsing. Created {len(trans)} transactions.")
-    return trans
+    # When only the newest rows are passed in, keep line ids relative to the whole file
+    num_rows = (total_rows if total_rows is not None else len(df)) - 1
+    positions = df.index.to_numpy()
+    line_ids = num_rows - positions
+
+    dates = pd.to_datetime(df[date_key], format=date_conversion, errors='coerce')
+
+    # Debits are used as-is; rows with a blank debit fall back to the negated credit
+    amounts, blank, invalid = clean_amounts(df[debit_key]) if debit_key in df.columns else (
+        pd.Series(float('nan'), index=df.index), pd.Series(True, index=df.index), pd.Series(False, index=df.index)
+    )
+    if credit_key:
+        credits, credit_blank, credit_invalid = clean_amounts(df[credit_key])
+        use_credit = blank & ~credit_blank
+        amounts = amounts.where(~use_credit, -credits)
+        # Credit rows have always been numbered from the top of the file, and stored
+        # rows are matched on line_id, so renumbering them would duplicate them
+        line_ids = np.where(use_credit.to_numpy(), positions, line_ids)
+        invalid = invalid | (use_credit & credit_invalid)
+        blank = blank & credit_blank
+
+    vendors_raw = df[vendor_key]
+    has_vendor = vendors_raw.notna()
+
+    failed = dates.isna() | invalid | ~has_vendor
+    # Rows with no amount at all (e.g. padding lines) are dropped, not reported
+    keep = ~failed & ~blank
+    failed = failed & ~blank
+    failed_rows = df.loc[failed].astype(str).values.tolist()
+
+    kept = keep.to_numpy()
+    count = int(kept.sum())
+    if count == 0:
+        logger.debug("Finished parsing. Created 0 transactions, {} failed.", len(failed_rows))
+        return empty, failed_rows
+
+    # Vendors repeat a lot, so normalize each distinct string once and keep a code per row
+    codes, uniques = pd.factorize(vendors_raw[kept].astype(str))
+    normalized = [string.capwords(v.replace("\t", " ")) for v in uniques]
+    normalized_codes, vendors = pd.factorize(np.array(normalized, dtype=object))
+
+    batch = transactions.TransactionBatch(
+        ids=generate_ids(count),
+        issuer_codes=np.zeros(count, dtype=np.int16),
+        card_issuers=[card_name],
+        dates=dates[kept].to_numpy(),
+        amounts=amounts[kept].to_numpy(dtype=float),
+        vendor_codes=normalized_codes[codes],
+        vendors=vendors,
+        line_ids=line_ids[kept],
+    )
+
+    logger.debug("Finished parsing. Created {} transactions, {} failed.", count, len(failed_rows))
+    return batch, failed_rows
+
+def parse(
+        df: pd.DataFrame,
+        card_name: str,
+        date_key: str,
+        date_conversion: str,
+        debit_key: str,
+        vendor_key: str,
+        credit_key: str = "",
+        total_rows: int = None,
+    ):
+    """Parse a statement DataFrame into a TransactionBatch, which iterates as TransactionData"""
+    batch, _ = parse_frame(
+        df=df,
+        card_name=card_name,
+        date_key=date_key,
+        date_conversion=date_conversion,
+        debit_key=debit_key,
+        vendor_key=vendor_key,
+        credit_key=credit_key,
+        total_rows=total_rows,
+    )
+    return batch
@@ -5,6 +5,11 @@ const API = axios.create({
 })
 
 class ApiRequests {
+    static getDashboard(sections) {
+        const url = "/dashboard";
+        return API.get(url, { params: { sections: sections.join(",") } })
+    }
+
     static getCategories() {
         const url = "/categories";
         return API.get(url)
@@ -15,11 +20,21 @@ class ApiRequests {
         return API.get(url)
     }
 
+    static getTransactions(params) {
+        const url = "/transactions"
+        return API.get(url, { params })
+    }
+
     static updateTransactionCategory(transaction) {
         const url = "/transactions"
         return API.post(url, transaction)
     }
 
+    static bulkCategorizeTransactions(data) {
+        const url = "/transactions/bulk"
+        return API.post(url, data)
+    }
+
     static addTransaction(data) {
         const url = "/transactions/add"
         return API.post(url, data)